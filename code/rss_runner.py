@@ -8,6 +8,7 @@ import carla
 import sys
 import os
 import time
+import copy
 
 sys.path.append(os.getenv('ROOT_SCENARIO_RUNNER'))
 from srunner.scenariomanager.carla_data_provider import CarlaActorPool, CarlaDataProvider
@@ -16,10 +17,14 @@ from srunner.tools.scenario_config_parser import ScenarioConfigurationParser
 #
 from tools import annealing
 from tools import robustness
+from tools import trajectory
 
 from scenario_runner_extension.rss_aux import defineRssParams
 from scenario_runner_extension.rss_aux import RssParamsInit
+from scenario_runner_extension.rss_params import RSS_PARAM_NAMES
 from scenario_runner_extension.rss_config_parser import parse_rss_scenario_configuration
+from scenario_runner_extension.rss_config_parser import apply_actor_overrides
+from scenario_runner_extension.rss_criteria import RssTest
 
 from scenarios.rss_ext_forward_incursion import RssExtForwardIncursion
 from scenarios.rss_ext_side_incursion import RssExtSideIncursion
@@ -35,7 +40,7 @@ from scenarios.rss_ext_parking_lot import RssExtParkingLot
 #RES_FOLDER = '../results-' + time.strftime("%d-%H-%M-%S")
 #if not os.path.exists(RES_FOLDER):
 #    os.makedirs(RES_FOLDER)
-#TRAJ_FILENAME = os.path.join(RES_FOLDER, 'trajectory.csv')
+#TRAJ_FILENAME = os.path.join(RES_FOLDER, 'trajectory.traj')
 
 class ScenarioRunner(object):
 
@@ -55,11 +60,15 @@ class ScenarioRunner(object):
     client_timeout = 60.0  # in seconds
     ego_drive_world = 20.0  # in seconds
     world = None
+    town = None
     manager = None
     additional_scenario_module = None
 
     def __init__(self, args):
         self.filename_traj = args.filename_traj
+        self.runs = 0
+        self.scenario_configurations = {}
+        self.group_configurations = {}
         """
         Setup CARLA client and world
         Setup ScenarioManager
@@ -179,6 +188,7 @@ class ScenarioRunner(object):
         Load a new CARLA world and provide data to CarlaActorPool and CarlaDataProvider
         """
         self.world = self.client.load_world(town)
+        self.town = town
 
         # Wait for the world to be ready
         self.world.tick()
@@ -194,9 +204,15 @@ class ScenarioRunner(object):
         Load and run the given scenario
         """
 
-        # Load scenario and run it
+        # Load scenario and run it; with --earlyStop the RssTest criterion
+        # ends it as soon as the robustness is decided
         self.manager.load_scenario(scenario)
         self.manager.run_scenario()
+        self.termination_reason = None
+        for criterion in scenario.scenario.get_criteria():
+            if isinstance(criterion, RssTest) and criterion.termination_reason:
+                self.termination_reason = criterion.termination_reason
+                print('Scenario stopped early: %s' % self.termination_reason)
 
         # Provide outputs if required
         # TODO:  Add new metrics
@@ -209,7 +225,7 @@ class ScenarioRunner(object):
         self.cleanup()
 
 
-    def simulate(self, config, args, rss_params):
+    def simulate(self, config, args, rss_params, variant=None):
         #file = open(self.filename_traj, 'w')
         #file.close()
         result = False
@@ -223,7 +239,9 @@ class ScenarioRunner(object):
                 #CarlaActorPool.set_world(self.world)
                 self.prepare_ego_vehicles(config)
                 self.prepare_camera(config)
-                scenario = scenario_class(self.world, rss_params, self.filename_traj, self.ego_vehicles, config, args.randomize, args.debug, variant=ARGUMENTS.scenario)
+                RssTest.trajectory_header = {'scenario': config.name, 'variant': variant or args.scenario,
+                                             'rss_params': rss_params, 'dt': 0.015}
+                scenario = scenario_class(self.world, rss_params, self.get_filename_traj(), self.ego_vehicles, config, args.randomize, args.debug, variant=variant or args.scenario)
                 result = True
             except Exception as exception:
                 print("The scenario cannot be loaded")
@@ -232,11 +250,74 @@ class ScenarioRunner(object):
                 self.cleanup()
                 pass
         self.load_and_run_scenario(args, config, scenario)
+        self.runs += 1
         #rob = robustness.getRobustness(self.filename_traj)
 
-        #return rob
+        # robustness monitored online by the RssTest criterion
+        for criterion in scenario.scenario.get_criteria():
+            if isinstance(criterion, RssTest) and criterion.monitor.robustness.value is not None:
+                return criterion.monitor.getRobustness()
         return 0
 
+    def get_filename_traj(self):
+        """
+        Trajectory file of the current run: filename_traj with the run number
+        before the extension (trajectory0.traj, trajectory1.traj, ...), or ""
+        to write none
+        """
+        if not self.filename_traj:
+            return ""
+        root, ext = os.path.splitext(self.filename_traj)
+        return '%s%i%s' % (root, self.runs, ext)
+
+    def setup_world(self, town):
+        """
+        Load the town with the fixed time step and weather of all runs
+        """
+        self.load_world(town)
+
+        settings = self.world.get_settings()
+        settings.fixed_delta_seconds = 0.015
+        self.world.apply_settings(settings)
+
+        # Set the sun to be directly overhead
+        weather = carla.WeatherParameters(sun_altitude_angle=90)
+        self.world.set_weather(weather)
+
+    def get_configuration(self, args, scenario_name):
+        """
+        Parse the configuration of a scenario once per runner
+        """
+        if scenario_name not in self.scenario_configurations:
+            scenario_config_file = ScenarioConfigurationParser.find_scenario_config(scenario_name, args.configFile)
+            self.scenario_configurations[scenario_name] = \
+                parse_rss_scenario_configuration(scenario_config_file, scenario_name)[0]
+        return self.scenario_configurations[scenario_name]
+
+    def evaluate(self, args, params):
+        """
+        Simulate one point of a mixed search (see tools.mixed): params holds
+        the RSS parameters and optionally 'scenario' and actor overrides
+        (see apply_actor_overrides).
+
+        Per group of equal non-RSS values (scenario, actor models and target
+        speeds) the configuration is parsed and overridden once and cached;
+        the world is only reloaded when the town changes. The actors are
+        still spawned for every run: the scenario classes spawn them and
+        remove them again when the run ends.
+        """
+        scenario_name = params.get('scenario', args.scenario)
+        key = tuple(sorted((name, value) for name, value in params.items() if name not in RSS_PARAM_NAMES))
+        if key not in self.group_configurations:
+            config = copy.deepcopy(self.get_configuration(args, scenario_name))
+            self.group_configurations[key] = apply_actor_overrides(config, params)
+        config = self.group_configurations[key]
+        if self.world is None or config.town != self.town:
+            self.setup_world(config.town)
+
+        rss_params = dict((name, value) for name, value in params.items() if name in RSS_PARAM_NAMES)
+        return self.simulate(config, args, rss_params, variant=scenario_name)
+
     def run(self, args):
         scenario_config_file = ScenarioConfigurationParser.find_scenario_config(args.scenario, args.configFile) # xml file
 
@@ -266,15 +347,7 @@ class ScenarioRunner(object):
         print('RSS params: %s' % rss_params)
 
         # Load the world once
-        self.load_world(config.town)
-
-        settings = self.world.get_settings()
-        settings.fixed_delta_seconds = 0.015
-        self.world.apply_settings(settings)
-
-        # Set the sun to be directly overhead
-        weather = carla.WeatherParameters(sun_altitude_angle=90)
-        self.world.set_weather(weather)
+        self.setup_world(config.town)
 
         return self.simulate(config, args, rss_params)
 
@@ -294,10 +367,21 @@ if __name__ == '__main__':
     #PARSER.add_argument('--waitForEgo', action="store_true", help='Connect the scenario to an existing ego vehicle')
     #PARSER.add_argument('--configFile', default='', help='Provide an additional scenario configuration file (*.xml)')
     PARSER.add_argument('--randomize', action="store_true", help='Scenario parameters are randomized')
+    PARSER.add_argument('--earlyStop', action="store_true", help='Stop a scenario once its robustness is decided')
+    PARSER.add_argument('--maxRelativeAccel', type=float, default=None,
+                        help='Bound on the closing acceleration [m/s^2] to also stop provably safe runs')
+    PARSER.add_argument('--resFolder', default='',
+                        help='Folder for the trajectory files of the runs (default: none are written)')
     ARGUMENTS = PARSER.parse_args()
+    RssTest.terminate_when_decided = ARGUMENTS.earlyStop
+    RssTest.max_relative_accel = ARGUMENTS.maxRelativeAccel
     ARGUMENTS.reloadWorld = True
     #ARGUMENTS.filename_traj = TRAJ_FILENAME
     ARGUMENTS.filename_traj = ""
+    if ARGUMENTS.resFolder:
+        if not os.path.exists(ARGUMENTS.resFolder):
+            os.makedirs(ARGUMENTS.resFolder)
+        ARGUMENTS.filename_traj = os.path.join(ARGUMENTS.resFolder, 'trajectory' + trajectory.EXTENSION)
     ARGUMENTS.configFile = os.path.join(os.getcwd(), 'rss.xml') # do not change this line
     ###############################################################
     # CHOOSE THE SCENARIO:
@@ -3,64 +3,9 @@ import weakref
 import inspect
 import numpy as np
 
-#==============================================================================
-def defineRssParams(x, names):
-    rss_params = {}
-    for i, name in enumerate(names):
-        rss_params[name] = x[i]
-    return rss_params
-#==============================================================================    
-'''
-class RssParamsDefault:
-    def __init__(self):
-        self.alpha_lon_accel_max = 3.5
-        self.alpha_lon_brake_max = 8.0
-        self.alpha_lon_brake_min = 4.0
-        self.alpha_lon_brake_min_correct = 3.0
-        self.alpha_lat_accel_max = 0.2
-        self.alpha_lat_brake_min = 0.8
-        self.lateral_fluctuation_margin = 0.0
-        self.response_time = 1.0
-'''
-#==============================================================================
-class RssParamsInit:
-    def __init__(self):
-        #0
-        self.alpha_lon_accel_max_min = 0.0
-        self.alpha_lon_accel_max_max = 10.0
-        # 1
-        self.alpha_lon_brake_max_min = 6
-        self.alpha_lon_brake_max_max = 20.0
-        # 2
-        self.alpha_lon_brake_min_min = 3.5
-        self.alpha_lon_brake_min_max = 6.0
-        # 3
-        self.alpha_lon_brake_min_correct_min = 0.0
-        self.alpha_lon_brake_min_correct_max = 3.5
-        # 4
-        self.alpha_lat_accel_max_min = 0.0
-        self.alpha_lat_accel_max_max = 2.0
-        # 5
-        self.alpha_lat_brake_min_min = 0.0
-        self.alpha_lat_brake_min_max = 2.0
-        # 6
-        self.lateral_fluctuation_margin_min = 0.0
-        self.lateral_fluctuation_margin_max = 0.001
-        # 7
-        self.response_time_min = 0.05
-        self.response_time_max = 5.0
+from scenario_runner_extension.rss_params import defineRssParams
+from scenario_runner_extension.rss_params import RssParamsInit
 
-    def getInit(self, names, **kwargs):
-        x = np.array([])
-        space = np.empty((0,2))
-
-        for name in names:
-            x = np.append(x, kwargs[name])
-
-            val_min = getattr(self, (name + '_min'))
-            val_max = getattr(self, (name + '_max'))
-            space = np.append(space, np.array([[val_min, val_max]]), axis=0)
-        return x, space
 # ==============================================================================
 def print_dynamics(rss_dynamics):
             print('************************')
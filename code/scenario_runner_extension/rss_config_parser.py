@@ -68,3 +68,20 @@ def parse_rss_scenario_configuration(scenario_config_file, scenario_name):
 
     return rss_scenario_configurations
 
+
+
+def apply_actor_overrides(config, overrides):
+    """
+    Set actor models and target speeds of a parsed configuration from a dict
+    such as tools.mixed.MixedSpace.decode returns. Recognized keys are
+    ego_model, ego_target_speed, other_<i>_model and other_<i>_target_speed;
+    all other keys are ignored.
+    """
+    actors = [('ego', config.ego_vehicles[0])] if config.ego_vehicles else []
+    actors += [('other_%i' % i, actor) for i, actor in enumerate(config.other_actors)]
+    for prefix, actor in actors:
+        if prefix + '_model' in overrides:
+            actor.model = overrides[prefix + '_model']
+        if prefix + '_target_speed' in overrides:
+            actor.target_speed = float(overrides[prefix + '_target_speed'])
+    return config
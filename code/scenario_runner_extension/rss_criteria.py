@@ -1,27 +1,54 @@
 import py_trees
 from tools import dist_aux
-from tools import other_aux
+from tools import robustness
+from tools import trajectory
 from srunner.scenariomanager.scenarioatomics.atomic_criteria import Criterion
+from srunner.scenariomanager.timer import GameTime
 import math
 
 class RssTest(Criterion):
 
-    def __init__(self, actor, filename, optional=False, name="CheckRss", terminate_on_failure=False):
+    # Early stop: end the scenario (criterion SUCCESS) once the monitored
+    # robustness cannot change any more. max_relative_accel [m/s^2] bounds
+    # how fast the ego and another actor can close in; with it (and the
+    # scenario timeout) a run that can no longer get closer than its
+    # minimum so far also stops.
+    terminate_when_decided = False
+    max_relative_accel = None
+    # Metadata for the trajectory file header (scenario, variant,
+    # rss_params, dt), set by the runner before each run
+    trajectory_header = {}
+
+    def __init__(self, actor, filename, optional=False, name="CheckRss", terminate_on_failure=False, timeout=None):
         super(RssTest, self).__init__(name, actor, 0, None, optional, terminate_on_failure)
         world = self.actor.get_world()
         self.vehicles = world.get_actors().filter('vehicle.*')
+        # ego first, then every other vehicle and walker for the distance
+        others = [a for a in self.vehicles if a.id != actor.id] + list(world.get_actors().filter('walker.*'))
+        self.dist_actors = [actor] + others
+        self.geometry = dist_aux.ActorGeometry()
+        # objectives updated every tick (see robustness.OnlineObjectives)
+        self.monitor = robustness.OnlineObjectives()
         self.filename = filename
         self.actor = actor
+        self.timeout = timeout
+        self.start_time = None
+        self.termination_reason = None
+        self.writer = None
+        self.frame = 0
 
 
     def update(self):
         # get distance between BBX
-        d = dist_aux.evaluate_dist(self.vehicles)
+        d = dist_aux.evaluate_dist(self.dist_actors, geometry=self.geometry)
 
         # get ego velocity
         ego_v = self.actor.get_velocity()
         ego_velocity = math.sqrt(ego_v.x**2 + ego_v.y**2 + ego_v.z**2) # [m/s]
+        self.monitor.update(d, ego_velocity)
+        decided = self.terminate_when_decided and self.check_decided(d, ego_velocity)
 
+        pov_velocity = 0.0
         if (len(self.vehicles) > 1):
             pov = [actor for actor in self.vehicles if actor.attributes.get('role_name') != 'hero'][0]
             pov_v = pov.get_velocity()
@@ -31,6 +58,13 @@ class RssTest(Criterion):
             #pos_pov = pov.get_location()
             #print('pos_ego = (%.6f, %.6f, %.6f), pos_pov = (%.6f, %.6f, %.6f)' % (pos_ego.x, pos_ego.y, pos_ego.z, pos_pov.x, pos_pov.y, pos_pov.z))
             #other_aux.write2csv(self.filename, [d, ego_velocity, pov_velocity])
+        if self.filename:
+            self.write_trajectory(d, ego_velocity, pov_velocity)
+        self.frame += 1
+
+        if decided:
+            print('EARLY STOP: %s' % self.termination_reason)
+            return py_trees.common.Status.SUCCESS
         return py_trees.common.Status.RUNNING
 
 
@@ -44,3 +78,30 @@ class RssTest(Criterion):
                     (ego_velocity + self.rss_dynamics.alpha_lon.accel_max.value*self.rss_dynamics.response_time.value)** -
                 1/(2*self.rss_dynamics.alpha_lon.brake_max.value)* pov_velocity)
         '''
+
+    def check_decided(self, d, ego_velocity):
+        now = GameTime.get_time()
+        if self.start_time is None:
+            self.start_time = now
+        if (not self.monitor.decided and self.max_relative_accel is not None
+                and self.timeout is not None and len(self.dist_actors) > 1):
+            time_left = max(self.timeout - (now - self.start_time), 0.0)
+            speeds = []
+            for other in self.dist_actors[1:]:
+                v = other.get_velocity()
+                speeds.append(math.sqrt(v.x**2 + v.y**2 + v.z**2))
+            self.monitor.settle_distance(d, ego_velocity + max(speeds), self.max_relative_accel, time_left)
+        self.termination_reason = self.monitor.reason()
+        return self.termination_reason is not None
+
+    def write_trajectory(self, d, ego_velocity, pov_velocity):
+        # binary trajectory file (tools.trajectory), read by getRobustness
+        if self.writer is None:
+            self.writer = trajectory.TrajectoryWriter(self.filename, **self.trajectory_header)
+        self.writer.append(frame=self.frame, distance=d, collision=int(d <= 0.0),
+                           ego_velocity=ego_velocity, pov_velocity=pov_velocity)
+
+    def terminate(self, new_status):
+        if self.writer is not None:
+            self.writer.close()
+        super(RssTest, self).terminate(new_status)
@@ -0,0 +1,96 @@
+import numpy as np
+
+# Parameter order used by RssParamsInit (see the index comments there)
+RSS_PARAM_NAMES = [
+    'alpha_lon_accel_max',
+    'alpha_lon_brake_max',
+    'alpha_lon_brake_min',
+    'alpha_lon_brake_min_correct',
+    'alpha_lat_accel_max',
+    'alpha_lat_brake_min',
+    'lateral_fluctuation_margin',
+    'response_time',
+]
+
+# Physically required orderings, (smaller, larger): a vehicle's minimum
+# braking cannot exceed its maximum braking, and the correct-lane minimum
+# braking cannot exceed the minimum braking
+RSS_ORDERING = [
+    ('alpha_lon_brake_min', 'alpha_lon_brake_max'),
+    ('alpha_lon_brake_min_correct', 'alpha_lon_brake_min'),
+]
+
+#==============================================================================
+def defineRssParams(x, names):
+    rss_params = {}
+    for i, name in enumerate(names):
+        rss_params[name] = x[i]
+    return rss_params
+#==============================================================================
+def defineRssConstraints(names, ordering=RSS_ORDERING, A=None, b=None):
+    # Linear constraints A x <= b over the parameter vector with the given
+    # names: one row x[small] - x[large] <= 0 per ordering pair whose names are
+    # both searched over, plus any extra rows A, b
+    rows = []
+    for small, large in ordering:
+        if small in names and large in names:
+            row = np.zeros(len(names))
+            row[names.index(small)] = 1.0
+            row[names.index(large)] = -1.0
+            rows.append(row)
+    A_all = np.array(rows).reshape(-1, len(names))
+    b_all = np.zeros(A_all.shape[0])
+    if A is not None:
+        A_all = np.vstack((A_all, np.atleast_2d(A)))
+        b_all = np.append(b_all, b)
+    return A_all, b_all
+#==============================================================================    
+'''
+class RssParamsDefault:
+    def __init__(self):
+        self.alpha_lon_accel_max = 3.5
+        self.alpha_lon_brake_max = 8.0
+        self.alpha_lon_brake_min = 4.0
+        self.alpha_lon_brake_min_correct = 3.0
+        self.alpha_lat_accel_max = 0.2
+        self.alpha_lat_brake_min = 0.8
+        self.lateral_fluctuation_margin = 0.0
+        self.response_time = 1.0
+'''
+#==============================================================================
+class RssParamsInit:
+    def __init__(self):
+        #0
+        self.alpha_lon_accel_max_min = 0.0
+        self.alpha_lon_accel_max_max = 10.0
+        # 1
+        self.alpha_lon_brake_max_min = 6
+        self.alpha_lon_brake_max_max = 20.0
+        # 2
+        self.alpha_lon_brake_min_min = 3.5
+        self.alpha_lon_brake_min_max = 6.0
+        # 3
+        self.alpha_lon_brake_min_correct_min = 0.0
+        self.alpha_lon_brake_min_correct_max = 3.5
+        # 4
+        self.alpha_lat_accel_max_min = 0.0
+        self.alpha_lat_accel_max_max = 2.0
+        # 5
+        self.alpha_lat_brake_min_min = 0.0
+        self.alpha_lat_brake_min_max = 2.0
+        # 6
+        self.lateral_fluctuation_margin_min = 0.0
+        self.lateral_fluctuation_margin_max = 0.001
+        # 7
+        self.response_time_min = 0.05
+        self.response_time_max = 5.0
+
+    def getInit(self, names, **kwargs):
+        x = np.array([kwargs[name] for name in names], dtype=float)
+        space = self.getSpace(names)
+        return x, space
+
+    def getSpace(self, names):
+        # Bounds only, (len(names), 2)
+        return np.array([[getattr(self, name + '_min'), getattr(self, name + '_max')] for name in names],
+                        dtype=float).reshape(-1, 2)
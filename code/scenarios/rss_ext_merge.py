@@ -142,6 +142,6 @@ class RssExtMerge(BasicScenario):
 
     def _create_test_criteria(self):
         criteria = []
-        rss_criterion = RssTest(self.ego_vehicles[0], self._filename)
+        rss_criterion = RssTest(self.ego_vehicles[0], self._filename, timeout=self.timeout)
         criteria.append(rss_criterion)
         return criteria
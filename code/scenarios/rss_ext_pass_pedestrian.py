@@ -106,6 +106,6 @@ class RssExtPassPedestrian(BasicScenario):
 
     def _create_test_criteria(self):
         criteria = []
-        rss_criterion = RssTest(self.ego_vehicles[0], self._filename)
+        rss_criterion = RssTest(self.ego_vehicles[0], self._filename, timeout=self.timeout)
         criteria.append(rss_criterion)
         return criteria
@@ -3,191 +3,281 @@
 #
 
 import numpy as np
-from numpy import linalg as LA
 import matplotlib.pyplot as plt
 import os
 import csv
+from concurrent.futures import wait, FIRST_COMPLETED
 
+from tools import evaluators
+from tools import run_log
+from tools import schedules
+from tools import history
+from tools import warm_start
+from tools.optimizers import AnnealingOptimizer
+from tools.sampling import get_next_samples, get_next_sample, is_feasible, check_feasible, \
+    accept_values, accept_value
 
-def get_next_sample(currentSample, initSpace):
-    
-    # Trick 1: Normalize the sample (rescale to map to [0,1])
-    # (This is all about sampler efficiency)
-    # Goal is to be able to sample from multivariate standard normal...
-    # and then convert back to this space.
-    #print('\ncurrent sample:')
-    #print(currentSample)
-
-    sampleWidth = currentSample - initSpace[:,0]
-    intervalWidths = initSpace[:,1] - initSpace[:,0]
-    #print('\ninterval width:')
-    #print(intervalWidths)
-    scaledSample = sampleWidth/intervalWidths
-    #print('\nscaled sample')
-    #print(scaledSample)
-    # Trick 2: Sample from multivariate normal and get a unit direction
-    direction = np.random.normal(size=(np.size(intervalWidths,)))
-    length = LA.norm(direction)
-    direction = direction/length
-
-    idx = direction>0
-    temp = (1-scaledSample)/direction
-    try:
-        z_plus_upper_step = np.min(temp[idx])
-    except ValueError:
-        z_plus_upper_step = np.inf
-
-    idx = direction<0
-    try:
-        z_minus_upper_step = np.min(np.abs(temp[idx]))
-    except ValueError:
-        z_minus_upper_step = np.inf
-
-    idx = direction<0
-    temp = (-scaledSample)/direction
-    try:
-        z_plus_lower_step = np.min(temp[idx])
-    except ValueError:
-        z_plus_lower_step = np.inf
-
-    idx = direction>0
-    try:
-        z_minus_lower_step = np.min(np.abs(temp[idx]))
-    except ValueError:
-        z_minus_lower_step = np.inf
-    z_minus_step = np.minimum(z_minus_lower_step, z_minus_upper_step)
-    z_plus_step = np.minimum(z_plus_lower_step, z_plus_upper_step)
-
-    z = np.random.uniform(0, 1.2)
-    if (z>1):
-        z=0.99
-
-    if np.random.uniform() < z_minus_step/(z_plus_step+z_minus_step):
-        z *= -z_minus_step
-    else:
-        z *= z_plus_step
-
-    # Trick 5: Convert back to actual sample space, basically undo 'Trick 1'
-    nextSample = (scaledSample + z*direction)*intervalWidths + initSpace[:,0]
-    #print('\nNEXT sample')
-    #print(nextSample)
-    return nextSample
-
-def accept_value(proposal, objective, temperature):
-    accept = False
-    # We always accept moves which improve the objective
-    if (proposal < objective):
-        accept = True
-    # And sometimes, moves which don't:
-    else:
-        # As the temperature increases it becomes less likely that
-        # we will accept a proposal which is less than the objective.
-        # Early on, it is easier to 'figuratively climb hills',
-        # although there is no gradient here.
-        # As the process moves forward the mass of the distribution
-        # becomes concentrated around the current best objective value
-        threshold = np.exp((objective - proposal) *temperature)
-        u = np.random.uniform(0.0, 1.0)
-        if (u <= threshold):
-            accept = True
-    return accept
 
 def plot(history):
-
+    # history: best_f_history, (steps,) or (steps, chains)
+    history = np.asarray(history)
     fig, ax = plt.subplots()
-    ax.plot(history, '-', label='Run %d, Solution: %f'%((j+1),solution))
-    ax.set_title('Hit and Run: Annealing Random Search, $x^2+y^2+z^2$')
+    for j, chain in enumerate(np.reshape(history, (history.shape[0], -1)).T):
+        ax.plot(chain, '-', label='Run %d, Solution: %f'%((j+1), np.min(chain)))
+    ax.set_title('Hit and Run: Annealing Random Search')
     ax.set_xlabel('Iteration')
     ax.set_ylabel('Objective Value')
     ax.legend()
     plt.show()
 
 
-def runFunc(compute_objective, currentSamples, initSpace, nruns, num_simult_runs, RES_FOLDER=False):
+def runFunc(compute_objective, currentSamples, initSpace, nruns, num_simult_runs, RES_FOLDER=False, executor=None,
+            resume=False, checkpoint_every=10, surrogate=None, schedule=None, stop=(),
+            storage='memory', history_buffer=64, constraints=None, prior=None):
+    # executor: None/'serial', 'thread', 'process' or an evaluator from
+    # tools.evaluators (e.g. CarlaPoolEvaluator); all chains of an iteration
+    # are evaluated through it concurrently
+    # RES_FOLDER: every step is appended to a binary run log (tools.run_log)
+    # and the sampler state is checkpointed every checkpoint_every steps.
+    # resume: continue from RES_FOLDER; steps already in the log are replayed
+    # from it instead of being simulated again.
+    # surrogate: optional tools.surrogate.GPSurrogate; once trained it picks
+    # one of surrogate.n_candidates proposals per chain for simulation and
+    # its prediction errors are saved as surrogate_error_history.csv
+    # schedule: cooling schedule from tools.schedules (default: i/100)
+    # stop: criteria from tools.stopping; the histories are truncated to the
+    # steps actually run when one of them fires
+    # storage: 'memory' keeps the full histories in RAM; 'stream' (needs
+    # RES_FOLDER) only keeps the last history_buffer steps and returns lazy
+    # views into the run log (see tools.history); no CSV export then
+    # constraints: (A, b), proposals satisfy A x <= b (see get_next_samples)
+    # prior: (X, f) of earlier campaigns on the same scenario (see
+    # tools.warm_start); seeds the chains with the best of them (which are
+    # not simulated again) and feeds all of them to the surrogate and an
+    # ObjectiveCache compute_objective
+    evaluator = evaluators.get_evaluator(executor)
+    for criterion in stop:
+        criterion.start()
     
     xdim = initSpace.shape[0]
+    n = num_simult_runs
+
+    if storage == 'stream':
+        if not RES_FOLDER:
+            raise ValueError("storage='stream' needs RES_FOLDER")
+        accept_x_history = history.RingHistory(RES_FOLDER, 'accept_x', (n, xdim), history_buffer)
+        x_history = history.RingHistory(RES_FOLDER, 'x', (n, xdim), history_buffer)
+        best_f_history = history.RingHistory(RES_FOLDER, 'best_f', (n,), history_buffer)
+        best_x_history = history.RingHistory(RES_FOLDER, 'best_x', (n, xdim), history_buffer)
+        f_history = history.RingHistory(RES_FOLDER, 'f', (n,), history_buffer)
+        accept_flags = None
+    elif storage == 'memory':
+        accept_x_history = np.zeros((nruns+1, n, xdim))
+        x_history = np.zeros((nruns+1, n, xdim))
+        best_f_history = np.zeros((nruns+1, n))
+        best_x_history = np.zeros((nruns+1, n, xdim))
+        f_history = np.zeros((nruns+1, n))
+        accept_flags = []
+    else:
+        raise ValueError('Unknown storage: %s' % storage)
+
+    state = run_log.load_checkpoint(RES_FOLDER) if (RES_FOLDER and resume) else None
+    if RES_FOLDER:
+        log = run_log.RunLog(RES_FOLDER, n, xdim, resume=state is not None)
+    known = np.full(n, np.nan)
+    if prior is not None:
+        currentSamples, known = warm_start.warm_start(prior, currentSamples, initSpace, compute_objective,
+                                                      surrogate, constraints, seed=state is None)
+    # proposals, acceptance and the per-chain bests (tools.optimizers)
+    optimizer = AnnealingOptimizer(currentSamples, initSpace, schedule, constraints, surrogate)
+
+    if state is None:
+        start = 0
+        logged = []
+        X = optimizer.ask()
+        # chains seeded from the prior start from their known values
+        Y = np.copy(known)
+        todo = np.isnan(known)
+        if np.any(todo):
+            Y[todo] = evaluator.map(compute_objective, X[todo])
+        for criterion in stop:
+            criterion.consume(int(np.sum(todo)))
+        optimizer.tell(X, Y)
+
+        accept_x_history[0] = X
+        x_history[0] = X
+        best_f_history[0] = optimizer.solutions
+        best_x_history[0] = optimizer.sol_x
+        f_history[0] = optimizer.objectives
+        if accept_flags is not None:
+            accept_flags.append(np.full((1, n), True))
 
-    accept_x_history = np.zeros((nruns+1, num_simult_runs, xdim))
-    accept_x_history[0, :, :] = np.copy(currentSamples)
-
-    x_history = np.zeros((nruns+1, num_simult_runs, xdim))
-    x_history[0, :, :] = np.copy(currentSamples)
-
-    
-    accept_flags = []
-    accept_flags.append(np.full((1, num_simult_runs), True))
-   
-    Y = []
-    for i in range(num_simult_runs):
-        #print(currentSamples[i])
-        y = compute_objective(currentSamples[i])
-        Y.append(y)
- 
-    objectives = np.copy(Y)
-    solutions  = np.copy(Y)
-
-    best_f_history = np.zeros((nruns+1, num_simult_runs))
-    best_f_history[0,:] = np.copy(objectives)
-
-    best_x_history = np.zeros((nruns+1, num_simult_runs, xdim))
-    best_x_history[0, :, :] = np.copy(currentSamples)
-    
-    f_history = np.zeros((nruns+1, num_simult_runs))
-    f_history[0,:] = np.copy(objectives)
-
-    sol_x = np.copy(currentSamples)
-
-    
-    
-    def saveToFile(i, scope, RES_FOLDER, flag='a'):
-        var_list = ['best_x_history', 'best_f_history', 'x_history', 'f_history']
         if RES_FOLDER:
-            for name in var_list:
-                filename = os.path.join(RES_FOLDER, name+'.csv')
-                with open(filename, flag) as file:
-                    writer = csv.writer(file, delimiter=',')
-                    val = eval(name, scope)
-                    val = val[i].reshape(-1)
-                    writer.writerow(val)
+            log.append(0, X, optimizer.objectives, X, optimizer.accepts, optimizer.sol_x, optimizer.solutions)
+            run_log.save_checkpoint(RES_FOLDER, **optimizer.get_state())
+    else:
+        start = min(state['step'], nruns)
+        logged = run_log.read_log(RES_FOLDER)
+        optimizer.set_state(state)
+        np.random.set_state(state['rng'])
+        first = 0 if storage == 'memory' else max(0, start+1-history_buffer)
+        for k in range(first, start+1):
+            x_history[k] = logged['x'][k]
+            f_history[k] = logged['f'][k]
+            accept_x_history[k] = logged['accept_x'][k]
+            best_x_history[k] = logged['best_x'][k]
+            best_f_history[k] = logged['best_f'][k]
+            if accept_flags is not None:
+                accept_flags.append(run_log.unpack_accept(logged['accept'][k], n) if k else np.full((1, n), True))
+        if surrogate is not None:
+            for k in range(start+1):
+                optimizer.remember(logged['x'][k], logged['f'][k])
+
+    nsteps = start
+    for i in range(start, nruns):
+        reason = None
+        for criterion in stop:
+            reason = reason or criterion.check(i, best_f_history)
+        if reason:
+            print('STOPPED AFTER %i STEPS: %s' % (i, reason))
+            break
+
+        nextSamples = optimizer.ask()
+        replay = (i+1 < len(logged))
+        if replay:
+            # logged after the last checkpoint: restored RNG reproduces the proposals
+            if not np.allclose(logged['x'][i+1], nextSamples):
+                raise ValueError('Run log in %s does not match the resumed sampler at step %d' % (RES_FOLDER, i+1))
+            proposals = np.array(logged['f'][i+1])
+        else:
+            proposals = np.asarray(evaluator.map(compute_objective, nextSamples), dtype=float)
+            for criterion in stop:
+                criterion.consume(n)
+        optimizer.tell(nextSamples, proposals)
+
+        f_history[i+1] = proposals
+        x_history[i+1] = nextSamples
+        accept_x_history[i+1] = optimizer.currentSamples
+        best_f_history[i+1] = optimizer.solutions
+        best_x_history[i+1] = optimizer.sol_x
+        if accept_flags is not None:
+            accept_flags.append(optimizer.accepts)
+        nsteps = i+1
 
-    
-    saveToFile(0, locals(), RES_FOLDER, 'w')
-    
+        if RES_FOLDER:
+            if not replay:
+                log.append(i+1, nextSamples, proposals, optimizer.currentSamples, optimizer.accepts,
+                           optimizer.sol_x, optimizer.solutions, optimizer.surrogate_error)
+            if (i+1) % checkpoint_every == 0 or i+1 == nruns:
+                run_log.save_checkpoint(RES_FOLDER, **optimizer.get_state())
+
+    if RES_FOLDER:
+        if nsteps < nruns and nsteps % checkpoint_every != 0:
+            run_log.save_checkpoint(RES_FOLDER, **optimizer.get_state())
+        log.close()
+    if evaluator is not executor:
+        evaluator.shutdown()
+
+    if storage == 'stream':
+        return history.lazy_histories(RES_FOLDER, nsteps)
+
+    if RES_FOLDER:
+        run_log.export_csv(RES_FOLDER)
+    m = nsteps+1
+    return best_x_history[:m], best_f_history[:m], x_history[:m], f_history[:m], accept_x_history[:m], accept_flags
+
+
+def runFuncTempering(compute_objective, currentSamples, initSpace, nruns, num_simult_runs,
+                     t_min=0.01, t_max=10.0, swap_every=1, **kwargs):
+    # Replica-exchange runFunc: the chains form a temperature ladder and swap
+    # states (see schedules.ReplicaExchange); chain j of the returned
+    # histories is the chain at the j-th temperature
+    schedule = schedules.ReplicaExchange(num_simult_runs, t_min, t_max, swap_every)
+    return runFunc(compute_objective, currentSamples, initSpace, nruns, num_simult_runs,
+                   schedule=schedule, **kwargs)
+
+
+def runFuncAsync(compute_objective, currentSamples, initSpace, nruns, num_simult_runs, RES_FOLDER=False, executor=None,
+                 constraints=None):
+    # Barrier-free variant of runFunc: every chain proposes, evaluates,
+    # accepts and advances its own temperature as soon as its own simulation
+    # returns, so fast scenarios never wait for slow ones.
+    # Returns a dict keyed by (chain, step), in completion order.
+    check_feasible(currentSamples, initSpace, constraints)
+    evaluator = evaluators.get_evaluator(executor)
     tsched = 100.
-    for i in range(nruns):
-        temperature = i*(1./tsched)
-        #print ('Run: %d, Temperature: %.3f'% (i, temperature))
-        nextSamples = []
-        Z = []
-        for j in range(num_simult_runs):
-            nextSamples.append(get_next_sample(currentSamples[j], initSpace))
-            z = compute_objective(nextSamples[j])
-            Z.append(z)
-
-        proposals = Z
-        
-        f_history[i+1,:] = np.copy(Z)
-        x_history[i+1,:,:]= np.copy(nextSamples)
-
-        accepts = []
-        for j in range(num_simult_runs):
-            accepts.append(accept_value(proposals[j],objectives[j],temperature))
-            if accepts[j]:
-                currentSamples[j] = nextSamples[j]
-                objectives[j] = proposals[j]
 
+    currentSamples = np.array(currentSamples, dtype=float)
+    objectives = np.full(num_simult_runs, np.inf)
+    solutions = np.full(num_simult_runs, np.inf)
+    sol_x = np.copy(currentSamples)
 
+    history = {}
+    if RES_FOLDER:
+        file = open(os.path.join(RES_FOLDER, 'history_async.csv'), 'w')
+        writer = csv.writer(file, delimiter=',')
+
+    pending = {}
+    for j in range(num_simult_runs):
+        x = np.copy(currentSamples[j])
+        pending[evaluator.submit(compute_objective, x)] = (j, 0, x)
+
+    while pending:
+        done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+        for future in done:
+            j, step, x = pending.pop(future)
+            proposal = float(future.result())
+
+            if step == 0:
+                accept = True
+            else:
+                # same schedule as runFunc, but on the chain's own step count
+                temperature = (step-1)*(1./tsched)
+                accept = accept_value(proposal, objectives[j], temperature)
+            if accept:
+                currentSamples[j] = x
+                objectives[j] = proposal
             if (objectives[j] < solutions[j]):
                 solutions[j] = objectives[j]
                 sol_x[j] = currentSamples[j]
 
-        accept_x_history[i+1,:,:] = np.copy(currentSamples)
-        accept_flags.append(np.copy(accepts))
-
-        best_f_history[i+1,:] = np.copy(solutions)
-        best_x_history[i+1, :, :] = np.copy(sol_x)
-
-        saveToFile(i+1, locals(), RES_FOLDER)
-
-
-    return best_x_history, best_f_history, x_history, f_history, accept_x_history, accept_flags
\ No newline at end of file
+            history[(j, step)] = {
+                'x': x,
+                'f': proposal,
+                'accept': accept,
+                'accept_x': np.copy(currentSamples[j]),
+                'best_x': np.copy(sol_x[j]),
+                'best_f': solutions[j],
+            }
+            if RES_FOLDER:
+                writer.writerow([j, step, int(accept), proposal, solutions[j]] + list(x) + list(sol_x[j]))
+                file.flush()
+
+            if step < nruns:
+                nextSample = get_next_sample(currentSamples[j], initSpace, constraints)
+                pending[evaluator.submit(compute_objective, nextSample)] = (j, step+1, nextSample)
+
+    if RES_FOLDER:
+        file.close()
+    if evaluator is not executor:
+        evaluator.shutdown()
+    return history
+
+
+def history_to_arrays(history, nruns, num_simult_runs):
+    # Dense (step, chain) arrays in the layout returned by runFunc
+    xdim = np.size(next(iter(history.values()))['x'])
+    best_x_history = np.zeros((nruns+1, num_simult_runs, xdim))
+    best_f_history = np.zeros((nruns+1, num_simult_runs))
+    x_history = np.zeros((nruns+1, num_simult_runs, xdim))
+    f_history = np.zeros((nruns+1, num_simult_runs))
+    accept_x_history = np.zeros((nruns+1, num_simult_runs, xdim))
+    accept_flags = np.zeros((nruns+1, num_simult_runs), dtype=bool)
+    for (j, step), rec in history.items():
+        best_x_history[step, j] = rec['best_x']
+        best_f_history[step, j] = rec['best_f']
+        x_history[step, j] = rec['x']
+        f_history[step, j] = rec['f']
+        accept_x_history[step, j] = rec['accept_x']
+        accept_flags[step, j] = rec['accept']
+    return best_x_history, best_f_history, x_history, f_history, accept_x_history, accept_flags
@@ -0,0 +1,224 @@
+'''
+Benchmark of the search engines on analytic objectives, no CARLA needed.
+
+Every engine is run on every test function over the RssParamsInit bounds for
+several seeds; evaluations-to-target, wall time per step (sampler overhead,
+the objectives are nearly free), peak Python memory (measured in a separate
+run, so tracing does not slow the timed one) and the final best value are
+reported as JSON.
+
+    cd code
+    python -m tools.benchmark --nruns 200 --chains 16 --seeds 5 --output bench.json
+'''
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+import numpy as np
+
+from tools import annealing
+from tools import optimizers
+from scenario_runner_extension.rss_params import RssParamsInit, RSS_PARAM_NAMES, defineRssParams
+
+
+#==============================================================================
+# Test functions. All take a parameter vector in RssParamsInit units and are
+# minimized; target is the value counted as 'reached'.
+#==============================================================================
+class TestFunction(object):
+    target = 1e-2
+
+    def __init__(self, names, space):
+        self.names = names
+        self.space = space
+        self.evaluations = 0
+
+    def unit(self, x):
+        return (np.asarray(x, dtype=float) - self.space[:,0])/(self.space[:,1] - self.space[:,0])
+
+    def __call__(self, x):
+        self.evaluations += 1
+        return float(self.value(x))
+
+
+class Sphere(TestFunction):
+    def value(self, x):
+        return np.sum((self.unit(x) - 0.3)**2)
+
+
+class Rastrigin(TestFunction):
+    target = 1.0
+
+    def value(self, x):
+        z = 10.24*self.unit(x) - 5.12 - 1.0  # optimum off-centre
+        return 10*z.size + np.sum(z**2 - 10*np.cos(2*np.pi*z))
+
+
+class Rosenbrock(TestFunction):
+    target = 1e-1
+
+    def value(self, x):
+        z = 4*self.unit(x) - 2
+        return np.sum(100*(z[1:] - z[:-1]**2)**2 + (1 - z[:-1])**2)
+
+
+class RssProxy(TestFunction):
+    '''
+    Smooth stand-in for the robustness of a following scenario. The ego keeps
+    the RSS safe distance computed from the searched parameters; then the
+    lead brakes at b_true while the ego really reacts after r_true and brakes
+    with its own alpha_lon_brake_min. The value is the final gap (in units of
+    scale metres); it is negative (falsified) only for short assumed response
+    times together with optimistic assumptions on the lead's braking.
+    '''
+    target = -0.5  # falsified by a margin; about 2% of the box
+    defaults = {'alpha_lon_accel_max': 3.5, 'alpha_lon_brake_max': 8.0,
+                'alpha_lon_brake_min': 4.0, 'response_time': 1.0}
+
+    def __init__(self, names, space, v=25/3.6, b_true=8.0, r_true=0.5, scale=10.0):
+        super(RssProxy, self).__init__(names, space)
+        self.v = v
+        self.b_true = b_true
+        self.r_true = r_true
+        self.scale = scale
+
+    def stopping_distance(self, r, a, b):
+        return self.v*r + 0.5*a*r**2 + (self.v + a*r)**2/(2*b)
+
+    def value(self, x):
+        p = dict(self.defaults)
+        p.update(defineRssParams(x, self.names))
+        a = p['alpha_lon_accel_max']
+        b_min = p['alpha_lon_brake_min']
+        d_rss = max(self.stopping_distance(p['response_time'], a, b_min)
+                    - self.v**2/(2*p['alpha_lon_brake_max']), 0.0)
+        gap = d_rss - self.stopping_distance(self.r_true, a, b_min) + self.v**2/(2*self.b_true)
+        return gap/self.scale
+
+
+FUNCTIONS = {
+    'sphere': Sphere,
+    'rastrigin': Rastrigin,
+    'rosenbrock': Rosenbrock,
+    'rss_proxy': RssProxy,
+}
+
+
+#==============================================================================
+# Engines: engine(objective, currentSamples, space, nruns, num_simult_runs)
+# returns best_f_history with shape (steps+1, chains)
+#==============================================================================
+def run_annealing(objective, currentSamples, space, nruns, num_simult_runs):
+    return annealing.runFunc(objective, currentSamples, space, nruns, num_simult_runs)[1]
+
+
+def run_async(objective, currentSamples, space, nruns, num_simult_runs):
+    hist = annealing.runFuncAsync(objective, currentSamples, space, nruns, num_simult_runs)
+    return annealing.history_to_arrays(hist, nruns, num_simult_runs)[1]
+
+
+def run_tempering(objective, currentSamples, space, nruns, num_simult_runs):
+    return annealing.runFuncTempering(objective, currentSamples, space, nruns, num_simult_runs)[1]
+
+
+def run_cmaes(objective, currentSamples, space, nruns, num_simult_runs):
+    # one generation per step, population size = number of chains
+    optimizer = optimizers.CMAES(space, popsize=num_simult_runs)
+    return optimizers.optimize(optimizer, objective, nruns+1)[1]
+
+
+ENGINES = {
+    'annealing': run_annealing,
+    'async': run_async,
+    'tempering': run_tempering,
+    'cmaes': run_cmaes,
+}
+
+
+def evaluations_to_target(best_f_history, target, num_simult_runs):
+    # Simulations spent until any chain reached target (None if never)
+    reached = np.nonzero(np.min(best_f_history, axis=1) <= target)[0]
+    if reached.size == 0:
+        return None
+    return int((reached[0] + 1)*num_simult_runs)
+
+
+def _run_engine(engine, function, names, nruns, num_simult_runs, seed):
+    # (objective, best_f_history) of one run from the given seed
+    space = RssParamsInit().getSpace(names)
+    objective = FUNCTIONS[function](names, space)
+    np.random.seed(seed)
+    currentSamples = np.random.uniform(space[:,0], space[:,1], size=(num_simult_runs, len(names)))
+    best_f_history = np.asarray(ENGINES[engine](objective, currentSamples, space, nruns, num_simult_runs))
+    return objective, best_f_history
+
+
+def run_one(engine, function, names, nruns, num_simult_runs, seed):
+    # Timed without tracemalloc (tracing slows the Python-heavy samplers
+    # several times); the peak memory comes from a second, traced run from
+    # the same seed
+    t = time.time()
+    objective, best_f_history = _run_engine(engine, function, names, nruns, num_simult_runs, seed)
+    wall = time.time() - t
+
+    tracemalloc.start()
+    _run_engine(engine, function, names, nruns, num_simult_runs, seed)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    steps = max(best_f_history.shape[0] - 1, 1)
+    return {
+        'engine': engine,
+        'function': function,
+        'seed': seed,
+        'evaluations': objective.evaluations,
+        'evaluations_to_target': evaluations_to_target(best_f_history, objective.target, num_simult_runs),
+        'wall_time_per_step': wall/steps,
+        'peak_memory_bytes': peak,
+        'final_best': float(np.min(best_f_history[-1])),
+    }
+
+
+def summarize(runs):
+    reached = [r['evaluations_to_target'] for r in runs if r['evaluations_to_target'] is not None]
+    return {
+        'success_rate': float(len(reached))/len(runs),
+        'median_evaluations_to_target': float(np.median(reached)) if reached else None,
+        'mean_wall_time_per_step': float(np.mean([r['wall_time_per_step'] for r in runs])),
+        'max_peak_memory_bytes': int(max(r['peak_memory_bytes'] for r in runs)),
+        'mean_final_best': float(np.mean([r['final_best'] for r in runs])),
+        'median_final_best': float(np.median([r['final_best'] for r in runs])),
+    }
+
+
+def run_benchmark(engines, functions, names, nruns, num_simult_runs, seeds):
+    results = {'config': {'names': names, 'nruns': nruns, 'num_simult_runs': num_simult_runs,
+                          'seeds': seeds}, 'runs': [], 'summary': {}}
+    for engine in engines:
+        for function in functions:
+            runs = [run_one(engine, function, names, nruns, num_simult_runs, seed) for seed in range(seeds)]
+            results['runs'] += runs
+            results['summary']['%s/%s' % (engine, function)] = summarize(runs)
+    return results
+
+
+if __name__ == '__main__':
+    PARSER = argparse.ArgumentParser(description='Benchmark search engines on analytic objectives')
+    PARSER.add_argument('--engines', nargs='+', default=sorted(ENGINES), choices=sorted(ENGINES))
+    PARSER.add_argument('--functions', nargs='+', default=sorted(FUNCTIONS), choices=sorted(FUNCTIONS))
+    PARSER.add_argument('--names', nargs='+', default=RSS_PARAM_NAMES, help='RSS parameters searched over')
+    PARSER.add_argument('--nruns', type=int, default=200, help='Steps per run')
+    PARSER.add_argument('--chains', type=int, default=16, help='Simultaneous chains')
+    PARSER.add_argument('--seeds', type=int, default=5, help='Seeds per engine and function')
+    PARSER.add_argument('--output', default='', help='JSON file (default: stdout)')
+    ARGUMENTS = PARSER.parse_args()
+
+    RESULTS = run_benchmark(ARGUMENTS.engines, ARGUMENTS.functions, ARGUMENTS.names,
+                            ARGUMENTS.nruns, ARGUMENTS.chains, ARGUMENTS.seeds)
+    if ARGUMENTS.output:
+        with open(ARGUMENTS.output, 'w') as file:
+            json.dump(RESULTS, file, indent=2)
+    else:
+        json.dump(RESULTS, sys.stdout, indent=2)
+        print()
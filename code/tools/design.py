@@ -0,0 +1,175 @@
+import numpy as np
+
+from scenario_runner_extension.rss_params import RssParamsInit
+from tools import sampling
+from tools import evaluators
+
+#==============================================================================
+# Space-filling designs over RSS parameters.
+#
+# All generators return points in the unit cube [0,1)^d; design() scales
+# them to the RssParamsInit _min/_max bounds of the chosen parameter names:
+#
+#   X, space = design(['response_time', 'alpha_lon_brake_min'], 64, method='sobol')
+#   best_x_history, ... = annealing.runFunc(compute_objective, X, space, nruns, 64)
+#==============================================================================
+def latin_hypercube(n, d, centered=False):
+    # One point in each of the n equal-probability strata of every dimension
+    offsets = 0.5 if centered else np.random.uniform(size=(n, d))
+    strata = np.argsort(np.random.uniform(size=(n, d)), axis=0)
+    return (strata + offsets)/float(n)
+
+
+def _primes(count):
+    primes = []
+    candidate = 2
+    while len(primes) < count:
+        if all(candidate % p for p in primes if p*p <= candidate):
+            primes.append(candidate)
+        candidate += 1
+    return primes
+
+
+def _radical_inverse(index, base, perm=None):
+    # Van der Corput sequence in the given base for an array of indices,
+    # optionally with a digit permutation (scrambling)
+    index = np.asarray(index, dtype=np.int64).copy()
+    result = np.zeros(index.shape)
+    factor = 1.0/base
+    while np.any(index > 0):
+        digit = index % base
+        if perm is not None:
+            digit = perm[digit]
+        result += digit*factor
+        index //= base
+        factor /= base
+    return result
+
+
+def halton(n, d, skip=0, scramble=True):
+    # Halton sequence with one prime base per dimension; scrambling applies a
+    # random digit permutation per dimension (0 stays 0 to keep points in [0,1))
+    points = np.empty((n, d))
+    index = np.arange(skip+1, skip+n+1)
+    for j, base in enumerate(_primes(d)):
+        perm = None
+        if scramble:
+            perm = np.concatenate(([0], 1 + np.random.permutation(base-1)))
+        points[:, j] = _radical_inverse(index, base, perm)
+    return points
+
+
+# Primitive polynomials and initial direction numbers (Joe & Kuo, new-joe-kuo-6.21201)
+# for dimensions 2..21; dimension 1 is the van der Corput sequence in base 2.
+_SOBOL_POLY = [
+    (1, 0, [1]), (2, 1, [1, 3]), (3, 1, [1, 3, 1]), (3, 2, [1, 1, 1]), (4, 1, [1, 1, 3, 3]),
+    (4, 4, [1, 3, 5, 13]), (5, 2, [1, 1, 5, 5, 17]), (5, 4, [1, 1, 5, 5, 5]), (5, 7, [1, 1, 7, 11, 19]),
+    (5, 11, [1, 1, 5, 1, 1]), (5, 13, [1, 1, 1, 3, 11]), (5, 14, [1, 3, 5, 5, 31]),
+    (6, 1, [1, 3, 3, 9, 7, 49]), (6, 13, [1, 1, 1, 15, 21, 21]), (6, 16, [1, 3, 1, 13, 27, 49]),
+    (6, 19, [1, 1, 1, 15, 7, 5]), (6, 22, [1, 3, 1, 15, 13, 25]), (6, 25, [1, 1, 5, 5, 19, 61]),
+    (7, 1, [1, 3, 7, 11, 23, 15, 103]), (7, 4, [1, 3, 7, 13, 13, 15, 69]),
+]
+SOBOL_MAX_DIM = len(_SOBOL_POLY) + 1
+_SOBOL_BITS = 30
+
+
+def _sobol_directions(d):
+    V = np.zeros((d, _SOBOL_BITS), dtype=np.int64)
+    V[0] = [1 << (_SOBOL_BITS-1-k) for k in range(_SOBOL_BITS)]
+    for j in range(1, d):
+        s, a, m = _SOBOL_POLY[j-1]
+        v = [m[k] << (_SOBOL_BITS-1-k) for k in range(s)]
+        for k in range(s, _SOBOL_BITS):
+            value = v[k-s] ^ (v[k-s] >> s)
+            for i in range(1, s):
+                if (a >> (s-1-i)) & 1:
+                    value ^= v[k-i]
+            v.append(value)
+        V[j] = v
+    return V
+
+
+def sobol(n, d, skip=0, scramble=True):
+    '''
+    Sobol sequence (Gray code construction). Scrambling is a random digital
+    shift, which keeps the (t, m, s)-net structure; use n a power of two for
+    the best balance.
+    '''
+    if d > SOBOL_MAX_DIM:
+        raise ValueError('sobol supports up to %d dimensions' % SOBOL_MAX_DIM)
+    V = _sobol_directions(d)
+    index = np.arange(skip, skip+n, dtype=np.int64)
+    gray = index ^ (index >> 1)
+    X = np.zeros((n, d), dtype=np.int64)
+    for k in range(_SOBOL_BITS):
+        bit = ((gray >> k) & 1).astype(bool)
+        X[bit] ^= V[:, k]
+    if scramble:
+        X ^= np.random.randint(0, 1 << _SOBOL_BITS, size=d, dtype=np.int64)
+    return X/float(1 << _SOBOL_BITS)
+
+
+def uniform(n, d):
+    return np.random.uniform(size=(n, d))
+
+
+METHODS = {
+    'lhs': latin_hypercube,
+    'sobol': sobol,
+    'halton': halton,
+    'uniform': uniform,
+}
+
+
+def scale(unit_points, space):
+    space = np.asarray(space, dtype=float)
+    return space[:,0] + unit_points*(space[:,1] - space[:,0])
+
+
+def design(names, n, method='lhs', params_init=None, constraints=None, **kwargs):
+    # n points over the named RSS parameters; returns (X, space) like
+    # RssParamsInit.getInit so X can seed runFunc chains directly.
+    # With constraints (A, b) the design is grown until n feasible points
+    # are found, keeping them in generation order.
+    params_init = params_init or RssParamsInit()
+    space = params_init.getSpace(names)
+    try:
+        generator = METHODS[method]
+    except KeyError:
+        raise ValueError('Unknown design method: %s' % method)
+    if constraints is None:
+        return scale(generator(n, len(names), **kwargs), space), space
+
+    m = n
+    for _ in range(20):
+        m *= 2
+        X = scale(generator(m, len(names), **kwargs), space)
+        X = X[sampling.is_feasible(X, space, constraints)]
+        if X.shape[0] >= n:
+            return X[:n], space
+    raise ValueError('Could not find %i feasible design points' % n)
+
+
+def evaluate_design(compute_objective, X, executor=None):
+    # Batch evaluation of a design, e.g. a screening sweep through the runner
+    evaluator = evaluators.get_evaluator(executor)
+    try:
+        return np.asarray(evaluator.map(compute_objective, X))
+    finally:
+        if evaluator is not executor:
+            evaluator.shutdown()
+
+
+def discrepancy(unit_points):
+    # Centered L2 discrepancy (lower is more uniform), to compare designs
+    X = np.asarray(unit_points, dtype=float)
+    n, d = X.shape
+    z = np.abs(X - 0.5)
+    term1 = (13.0/12.0)**d
+    term2 = 2.0/n*np.sum(np.prod(1 + 0.5*z - 0.5*z**2, axis=1))
+    prod = np.ones((n, n))
+    for j in range(d):
+        prod *= 1 + 0.5*z[:, j][:, np.newaxis] + 0.5*z[:, j][np.newaxis, :] \
+            - 0.5*np.abs(X[:, j][:, np.newaxis] - X[:, j][np.newaxis, :])
+    term3 = np.sum(prod)/n**2
+    return np.sqrt(max(term1 - term2 + term3, 0.0))
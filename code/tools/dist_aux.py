@@ -1,5 +1,3 @@
-import carla
-from shapely.geometry import Polygon
 import numpy as np
 import math
 
@@ -15,114 +13,381 @@ def is_between(v1, v2, v3):
 '''
 
 
+#==============================================================================
+# Oriented box kernels on corner arrays of shape (..., 4, 2) (corners in
+# order around the box); leading dimensions broadcast, so one call handles
+# all pairs of a tick or all ticks of a recording.
+#==============================================================================
+def _edges(rect):
+    # segment start and end points, the last edge wraps around (4 --> 0)
+    return rect, np.roll(rect, -1, axis=-2)
+
+
+def point_segment_distance(P, S0, S1):
+    # Closed-form distance from points P to segments S0--S1 (all (..., 2))
+    segm = S1 - S0
+    length2 = np.sum(segm*segm, axis=-1)
+    t = np.sum((P - S0)*segm, axis=-1)/np.where(length2 > 0, length2, 1.0)
+    t = np.clip(t, 0.0, 1.0)
+    foot = S0 + t[..., np.newaxis]*segm
+    return np.sqrt(np.sum((P - foot)**2, axis=-1))
+
+
+def boxes_overlap(rect0, rect1):
+    # Separating axis test: the boxes overlap with positive area unless
+    # their projections on some edge normal are disjoint (touching counts as
+    # disjoint, like a zero-area Shapely intersection)
+    rect0, rect1 = np.broadcast_arrays(np.asarray(rect0, dtype=float), np.asarray(rect1, dtype=float))
+    s0, e0 = _edges(rect0)
+    s1, e1 = _edges(rect1)
+    edges = np.concatenate((e0 - s0, e1 - s1), axis=-2)
+    axes = np.stack((-edges[..., 1], edges[..., 0]), axis=-1)
+    proj0 = np.einsum('...kd,...jd->...kj', axes, rect0)
+    proj1 = np.einsum('...kd,...jd->...kj', axes, rect1)
+    separated = (np.max(proj0, axis=-1) <= np.min(proj1, axis=-1)) | \
+                (np.max(proj1, axis=-1) <= np.min(proj0, axis=-1))
+    separated &= np.any(axes != 0, axis=-1)
+    return ~np.any(separated, axis=-1)
+
+
+def vert_segm_distances(rect_vert, rect_segm):
+    # (..., 4, 4) distances from every vertex of rect_vert to every edge of
+    # rect_segm
+    s0, s1 = _edges(np.asarray(rect_segm, dtype=float))
+    P = np.asarray(rect_vert, dtype=float)[..., :, np.newaxis, :]
+    return point_segment_distance(P, s0[..., np.newaxis, :, :], s1[..., np.newaxis, :, :])
+
+
+def boxes_distance(rect0, rect1):
+    # Minimum distance between boxes, 0.0 where they overlap; the minimum
+    # over vertex-to-edge distances in both directions is exact for
+    # disjoint convex polygons
+    d = np.minimum(np.min(vert_segm_distances(rect0, rect1), axis=(-2, -1)),
+                   np.min(vert_segm_distances(rect1, rect0), axis=(-2, -1)))
+    return np.where(boxes_overlap(rect0, rect1), 0.0, d)
+
+
 def check_collision(rect0, rect1):
-    p1 = Polygon(tuple(map(tuple, rect0)))
-    p2 = Polygon(tuple(map(tuple, rect1)))
-    collision = (p1.intersection(p2).area > 0.0)
-    return collision
+    return bool(boxes_overlap(rect0, rect1))
 
 
 def get_dist_vert_vert(rect0, rect1):
-    perm = [[x,y] for x in range(0, np.shape(rect0)[0]) for y in range(np.shape(rect1)[0])]
     # Take among all 4 * 4 = 16 pairs of points (points from different rectangles)
-    D = []
-    for pair in perm:
-        v0 = rect0[pair[0]]
-        v1 = rect1[pair[1]]
-        D.append(get_distance(v0, v1))
-    d = min(D)
-    return d
+    rect0 = np.asarray(rect0, dtype=float)
+    rect1 = np.asarray(rect1, dtype=float)
+    diff = rect0[:, np.newaxis, :] - rect1[np.newaxis, :, :]
+    return float(np.sqrt(np.min(np.sum(diff**2, axis=-1))))
+
 
 def get_dist_vert_segm(rect_vert, rect_segm):
-    perm = [[x,y] for x in range(0, np.shape(rect_vert)[0]) for y in range(np.shape(rect_segm)[0])]
-    ##############################
-    D = []
-    for pair in perm:
-        # take one point from rect_vert
-        ind_vert = pair[0]
-        # take two consequtive points from rect_segm
-        ind_s0 = pair[1]
-        ind_s1 = (pair[1]+1) % np.shape(rect_segm)[0]  # if 4 --> 0
-
-        point_vert = rect_vert[ind_vert]
-        point_s0 = rect_segm[ind_s0]
-        point_s1 = rect_segm[ind_s1]
-
-        vect_segm = point_s0-point_s1
-        vect_0 = point_s0-point_vert
-        vect_1 = point_vert-point_s1
-
-        angle0 = math.acos(np.dot(vect_segm, vect_0) / (np.linalg.norm(vect_segm) * np.linalg.norm(vect_0)))
-        angle1 = math.acos(np.dot(vect_segm, vect_1) / (np.linalg.norm(vect_segm) * np.linalg.norm(vect_1)))
-
-        # check if perpendicular belongs to the line p1--p2
-        notBetween = False
-        if (abs(math.degrees(angle0)) >90 or abs(math.degrees(angle1)) > 90):
-            notBetween = True
-        if not notBetween:
-            #print('point_s0 = (%.2f, %.2f)' % (point_s0[0], point_s0[1]))
-            #print('point_s1 = (%.2f, %.2f)' % (point_s1[0], point_s1[1]))
-            #print('point_vert = (%.2f, %.2f)' % (point_vert[0], point_vert[1]))
-            #print(math.degrees(angle0))
-            #print(math.degrees(angle1))
-
-            # perp length from vert to segment
-            perp = np.linalg.norm(np.cross(point_s1-point_s0, point_s0-point_vert))/np.linalg.norm(point_s0-point_s1)
-            D.append(perp)
-    try:
-        d = min(D)
-    except ValueError:
-        d = float('Inf')
-    return d
-
-
-def evaluate_dist(vehicles):
-    # What should this return if there is only one vehicle?
-
-    V = [] # array of vertices
-    for vehicle in vehicles:
-        print('vehicle')
-        print(vehicle)
-        transform = vehicle.get_transform()
-        bounding_box = vehicle.bounding_box
-        #print(bounding_box)
-        #print(transform)
-
-        # 8 bounding box vertices relative to (0,0,0)
-        ext = bounding_box.extent
-        points = np.array([
-            [  ext.x,   ext.y],
-            [- ext.x,   ext.y],
-            [- ext.x, - ext.y],
-            [  ext.x, - ext.y]
-        ])
-
-        for point in points:
-            ll = carla.Location(x=point[0],y=point[1],z=1)
-            ll = transform.transform(ll)
-
-            point[0] = ll.x
-            point[1] = ll.y
-            #world.world.debug.draw_point(ll, color=carla.Color(r=255, g=0, b=0))
-        V.append(points)
-        #world.world.debug.draw_box(bounding_box, transform.rotation)
-
-    d = 0.0
-    if (len(V) >= 2):
-        rect0 = V[0]
-        rect1 = V[1]
-
-        bool_collision = check_collision(rect0, rect1)
-        #print(bool_collision)
-
-        if not bool_collision:
-            min1 = get_dist_vert_vert(rect0, rect1)
-            min2 = get_dist_vert_segm(rect0, rect1)
-            min3 = get_dist_vert_segm(rect1, rect0)
-
-            #print('min1 = %.2f' % min1)
-            #print('min2 = %.2f' % min2)
-            #print('min3 = %.2f' % min3)
-            d = min(min1, min2, min3)
-
-    return d
+    # Shortest perpendicular from a vertex to an edge, only counting edges
+    # whose foot of the perpendicular lies on the edge (Inf if none does)
+    s0, s1 = _edges(np.asarray(rect_segm, dtype=float))
+    P = np.asarray(rect_vert, dtype=float)[:, np.newaxis, :]
+    segm = s1 - s0
+    t = np.sum((P - s0)*segm, axis=-1)/np.sum(segm*segm, axis=-1)
+    between = (t >= 0.0) & (t <= 1.0)
+    if not np.any(between):
+        return float('Inf')
+    return float(np.min(vert_segm_distances(rect_vert, rect_segm)[between]))
+
+
+#==============================================================================
+# Minimum distances among many actors. Each box is bounded by the circle
+# around its centre through its farthest corner, which gives the lower bound
+# max(0, |c_i - c_j| - r_i - r_j) on the box distance; exact distances are
+# only computed for pairs that this bound (or a uniform grid, for the
+# all-pairs case) cannot rule out.
+#==============================================================================
+def bounding_circles(corners):
+    corners = np.asarray(corners, dtype=float)
+    centers = np.mean(corners, axis=-2)
+    radii = np.max(np.sqrt(np.sum((corners - centers[..., np.newaxis, :])**2, axis=-1)), axis=-1)
+    return centers, radii
+
+
+def ego_min_distance(corners, ego=0):
+    # Distance from box ego to the closest other box of corners (N, 4, 2)
+    # and the index of that box; (Inf, -1) if there is no other box.
+    # Candidates are visited by increasing lower bound in batches, stopping
+    # as soon as the next bound exceeds the best exact distance
+    corners = np.asarray(corners, dtype=float)
+    centers, radii = bounding_circles(corners)
+    bound = np.sqrt(np.sum((centers - centers[ego])**2, axis=-1)) - radii - radii[ego]
+    bound[ego] = np.inf
+    order = np.argsort(bound)[:corners.shape[0]-1]
+
+    best, best_j = np.inf, -1
+    batch = 8
+    for first in range(0, order.size, batch):
+        idx = order[first:first+batch]
+        if bound[idx[0]] >= best:
+            break
+        d = boxes_distance(corners[ego], corners[idx])
+        k = np.argmin(d)
+        if d[k] < best:
+            best, best_j = float(d[k]), int(idx[k])
+        batch *= 2
+    return best, best_j
+
+
+def nearest_distances(corners, cell=None):
+    # Distance from every box to its closest other box and its index, for
+    # all actors at once. Broad phase: a uniform grid of size cell (default
+    # four times the largest radius); only pairs in the same or adjacent
+    # cells are computed exactly, then boxes without a close enough
+    # neighbour are checked against the remaining candidates
+    corners = np.asarray(corners, dtype=float)
+    N = corners.shape[0]
+    nearest = np.full(N, np.inf)
+    nearest_j = np.full(N, -1, dtype=int)
+    if N < 2:
+        return nearest, nearest_j
+    centers, radii = bounding_circles(corners)
+    r_max = np.max(radii)
+    cell = cell or max(4*r_max, 1e-6)
+
+    cells = {}
+    for i, key in enumerate(map(tuple, np.floor(centers/cell).astype(int))):
+        cells.setdefault(key, []).append(i)
+    pairs = []
+    for (cx, cy), members in cells.items():
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for j in cells.get((cx+dx, cy+dy), ()):
+                    pairs += [(i, j) for i in members if i < j]
+    if pairs:
+        pairs = np.array(pairs)
+        d = boxes_distance(corners[pairs[:, 0]], corners[pairs[:, 1]])
+        for a, b in ((0, 1), (1, 0)):
+            # per box minimum over its candidate pairs
+            order = np.lexsort((d, pairs[:, a]))
+            first = np.unique(pairs[order, a], return_index=True)[1]
+            rows = order[first]
+            nearest[pairs[rows, a]] = np.minimum(nearest[pairs[rows, a]], d[rows])
+            better = d[rows] <= nearest[pairs[rows, a]]
+            nearest_j[pairs[rows, a][better]] = pairs[rows, b][better]
+
+    # boxes outside the 3x3 block are at least cell - r_i - r_max away; the
+    # others are settled in one batch against every box whose lower bound
+    # is below the closest centre distance (an upper bound, boxes contain
+    # their centres)
+    unsure = np.nonzero(nearest > cell - radii - r_max)[0]
+    if unsure.size:
+        center_d = np.sqrt(np.sum((centers[unsure, np.newaxis, :] - centers[np.newaxis, :, :])**2, axis=-1))
+        center_d[np.arange(unsure.size), unsure] = np.inf
+        bound = center_d - radii[unsure, np.newaxis] - radii[np.newaxis, :]
+        rows, cols = np.nonzero(bound <= np.min(center_d, axis=1)[:, np.newaxis])
+        d = boxes_distance(corners[unsure[rows]], corners[cols])
+        for u, i in enumerate(unsure):
+            mine = np.nonzero(rows == u)[0]
+            k = mine[np.argmin(d[mine])]
+            nearest[i], nearest_j[i] = d[k], cols[k]
+    return nearest, nearest_j
+
+
+#==============================================================================
+# Offline evaluation on recorded trajectories, no simulator needed:
+#   poses (T, actors, 3) with x, y and yaw in degrees (as carla.Rotation)
+#   extents (actors, 2) with the half-lengths bounding_box.extent.x/.y
+#==============================================================================
+def box_corners(poses, extents):
+    # (..., actors, 4, 2) corners, in the order of evaluate_dist
+    poses = np.asarray(poses, dtype=float)
+    extents = np.asarray(extents, dtype=float)
+    signs = np.array([[1, 1], [-1, 1], [-1, -1], [1, -1]], dtype=float)
+    local = signs*extents[..., np.newaxis, :]
+    yaw = np.radians(poses[..., 2])
+    c = np.cos(yaw)[..., np.newaxis]
+    s = np.sin(yaw)[..., np.newaxis]
+    x = poses[..., 0, np.newaxis] + c*local[..., 0] - s*local[..., 1]
+    y = poses[..., 1, np.newaxis] + s*local[..., 0] + c*local[..., 1]
+    return np.stack((x, y), axis=-1)
+
+
+def trajectory_distances(poses, extents, ego=0, chunk=4096):
+    # (T, actors) distance from the ego box to every actor at every tick
+    # (Inf in the ego column), in chunks of ticks to bound memory
+    poses = np.asarray(poses, dtype=float)
+    T, N = poses.shape[:2]
+    D = np.full((T, N), np.inf)
+    others = np.array([j for j in range(N) if j != ego], dtype=int)
+    if others.size == 0:
+        return D
+    for first in range(0, T, chunk):
+        corners = box_corners(poses[first:first+chunk], extents)
+        D[first:first+chunk, others] = boxes_distance(corners[:, ego:ego+1], corners[:, others])
+    return D
+
+
+def trajectory_min_distance(poses, extents, ego=0):
+    # (T,) the evaluate_dist value of every tick
+    D = trajectory_distances(poses, extents, ego)
+    if D.shape[1] < 2:
+        return np.zeros(D.shape[0])
+    return np.min(D, axis=1)
+
+
+#==============================================================================
+# Continuous collision checks between ticks. Each box moves from pose p0 to
+# pose p1 over an interval with linear position and shortest-arc yaw, so
+# the distance between two boxes changes by at most
+#   mu = |dc_a - dc_b| + r_a*|dyaw_a| + r_b*|dyaw_b|
+# per interval (r: centre-to-corner radius). Conservative advancement with
+# steps d/mu can therefore not jump over a contact, however thin.
+#==============================================================================
+def interpolate_poses(p0, p1, s):
+    # poses at interval fraction s (broadcast over leading dimensions); the
+    # yaw takes the short way round, so p0 -> p1 must turn by less than 180
+    # degrees (always the case between two ticks)
+    p0 = np.asarray(p0, dtype=float)
+    p1 = np.asarray(p1, dtype=float)
+    s = np.asarray(s, dtype=float)[..., np.newaxis]
+    dyaw = (p1[..., 2] - p0[..., 2] + 180.0) % 360.0 - 180.0
+    step = np.concatenate((p1[..., :2] - p0[..., :2], dyaw[..., np.newaxis]), axis=-1)
+    return p0 + s*step
+
+
+def _motion_bound(a0, a1, ext_a, b0, b1, ext_b):
+    def spin(p0, p1):
+        return np.radians(np.abs((p1[..., 2] - p0[..., 2] + 180.0) % 360.0 - 180.0))
+    translation = (a1[..., :2] - a0[..., :2]) - (b1[..., :2] - b0[..., :2])
+    return np.sqrt(np.sum(translation**2, axis=-1)) \
+        + np.sqrt(np.sum(ext_a**2, axis=-1))*spin(a0, a1) \
+        + np.sqrt(np.sum(ext_b**2, axis=-1))*spin(b0, b1)
+
+
+def swept_collision(a0, a1, ext_a, b0, b1, ext_b, tol=1e-3, sep_tol=0.05, max_iter=100, max_samples=64):
+    '''
+    Box a moves from pose a0 to a1 and box b from b0 to b1 (poses (M, 3),
+    extents (M, 2) or (2,)). Returns, per interval, the fraction of the
+    interval at first contact (NaN if none; contact means a distance below
+    tol) and the minimum separation, sampled finely enough to be within
+    sep_tol of the true minimum (up to max_samples samples). Each box turns
+    the short way round (see interpolate_poses): split longer turns.
+    '''
+    a0, a1, b0, b1 = [np.atleast_2d(np.asarray(p, dtype=float)) for p in (a0, a1, b0, b1)]
+    a0, a1, b0, b1 = np.broadcast_arrays(a0, a1, b0, b1)
+    M = a0.shape[0]
+    ext_a = np.broadcast_to(np.asarray(ext_a, dtype=float), (M, 2))
+    ext_b = np.broadcast_to(np.asarray(ext_b, dtype=float), (M, 2))
+    mu = _motion_bound(a0, a1, ext_a, b0, b1, ext_b)
+
+    def distance(idx, s):
+        return boxes_distance(box_corners(interpolate_poses(a0[idx], a1[idx], s), ext_a[idx]),
+                              box_corners(interpolate_poses(b0[idx], b1[idx], s), ext_b[idx]))
+
+    # minimum separation: distance is mu-Lipschitz in s
+    K = int(np.clip(np.ceil(np.max(mu)/(2*sep_tol)) + 1, 2, max_samples))
+    grid = np.linspace(0.0, 1.0, K)
+    idx = np.repeat(np.arange(M), K)
+    min_sep = np.min(distance(idx, np.tile(grid, M)).reshape(M, K), axis=1)
+
+    # first contact by conservative advancement
+    contact = np.full(M, np.nan)
+    s = np.zeros(M)
+    active = np.arange(M)
+    for _ in range(max_iter):
+        if active.size == 0:
+            break
+        d = distance(active, s[active])
+        hit = d <= tol
+        contact[active[hit]] = s[active[hit]]
+        with np.errstate(divide='ignore'):
+            s[active] += np.where(mu[active] > 0, d/mu[active], np.inf)
+        active = active[~hit & (s[active] <= 1.0)]
+    # (grazing contacts may need more iterations: fall back to the samples)
+    if active.size:
+        close = np.nonzero(min_sep[active] <= tol)[0]
+        contact[active[close]] = s[active[close]]
+    min_sep[np.isfinite(contact)] = np.minimum(min_sep[np.isfinite(contact)], tol)
+    return contact, min_sep
+
+
+def trajectory_contacts(poses, extents, dt, ego=0, **kwargs):
+    '''
+    Continuous version of trajectory_min_distance for recordings with time
+    step dt: per interval between consecutive ticks, the time (from the
+    start of the recording) of the first contact of the ego with any actor
+    (NaN if none) and the minimum separation.
+    '''
+    poses = np.asarray(poses, dtype=float)
+    extents = np.asarray(extents, dtype=float)
+    T, N = poses.shape[:2]
+    first = np.full(T-1, np.nan)
+    min_sep = np.full(T-1, np.inf)
+    for j in range(N):
+        if j == ego:
+            continue
+        c, d = swept_collision(poses[:-1, ego], poses[1:, ego], extents[ego],
+                               poses[:-1, j], poses[1:, j], extents[j], **kwargs)
+        first = np.fmin(first, c)
+        min_sep = np.minimum(min_sep, d)
+    return (np.arange(T-1) + first)*dt, min_sep
+
+
+def time_to_collision(prev_poses, poses, extents, dt, horizon=3.0, ego=0, **kwargs):
+    # Seconds until the ego touches an actor when every actor keeps its
+    # last per-tick motion (prev_poses -> poses, (actors, 3)) for up to
+    # horizon seconds; Inf if it does not
+    prev_poses = np.asarray(prev_poses, dtype=float)
+    poses = np.asarray(poses, dtype=float)
+    extents = np.asarray(extents, dtype=float)
+    steps = horizon/dt
+    dyaw = (poses[:, 2] - prev_poses[:, 2] + 180.0) % 360.0 - 180.0
+    motion = steps*np.column_stack((poses[:, :2] - prev_poses[:, :2], dyaw))
+    others = [j for j in range(poses.shape[0]) if j != ego]
+    if not others:
+        return np.inf
+    # swept_collision turns every box the short way round, so the horizon
+    # is cut into pieces in which no actor turns by more than 90 degrees
+    pieces = max(1, int(np.ceil(np.max(np.abs(motion[:, 2]))/90.0)))
+    fractions = np.arange(pieces + 1)/float(pieces)
+    path = poses + fractions[:, np.newaxis, np.newaxis]*motion    # (pieces+1, actors, 3)
+    start, end = path[:-1], path[1:]
+    n = len(others)
+    contact, _ = swept_collision(np.repeat(start[:, ego], n, axis=0), np.repeat(end[:, ego], n, axis=0),
+                                 extents[ego], start[:, others].reshape(-1, 3), end[:, others].reshape(-1, 3),
+                                 np.tile(extents[others], (pieces, 1)), **kwargs)
+    contact = contact.reshape(pieces, n) + np.arange(pieces)[:, np.newaxis]
+    if np.all(np.isnan(contact)):
+        return np.inf
+    return float(np.nanmin(contact)/pieces*horizon)
+
+
+class ActorGeometry(object):
+    '''
+    Static box extents per actor id, read from the (RPC backed)
+    bounding_box once, and the (x, y, yaw) poses of a list of actors.
+    Keep one per scenario run: actor ids are not unique across worlds.
+    '''
+    def __init__(self):
+        self.extents = {}
+
+    def extent(self, actor):
+        if actor.id not in self.extents:
+            ext = actor.bounding_box.extent
+            self.extents[actor.id] = (ext.x, ext.y)
+        return self.extents[actor.id]
+
+    def poses(self, actors):
+        poses = np.empty((len(actors), 3))
+        for i, actor in enumerate(actors):
+            transform = actor.get_transform()
+            poses[i] = (transform.location.x, transform.location.y, transform.rotation.yaw)
+        return poses
+
+    def corners(self, actors):
+        # (actors, 4, 2) in one matrix transform (yaw only; pitch and roll
+        # are ignored, as for the flat maps of the scenarios)
+        return box_corners(self.poses(actors), [self.extent(actor) for actor in actors])
+
+
+def evaluate_dist(vehicles, ego=0, geometry=None):
+    # Distance from vehicles[ego] to the closest other actor (vehicles or
+    # walkers); 0.0 if there is only one. Pass the same ActorGeometry every
+    # tick to read the bounding boxes only once.
+    if len(vehicles) < 2:
+        return 0.0
+    geometry = geometry or ActorGeometry()
+    return ego_min_distance(geometry.corners(vehicles), ego)[0]
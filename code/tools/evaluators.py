@@ -0,0 +1,129 @@
+import queue
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+
+#==============================================================================
+# Backends evaluating compute_objective over a batch of samples.
+# map() returns the objective values in the same order as the samples,
+# whatever order the simulations actually finish in; submit() returns a
+# concurrent.futures.Future for a single sample.
+#==============================================================================
+class SerialEvaluator(object):
+    def map(self, compute_objective, samples):
+        return [compute_objective(x) for x in samples]
+
+    def submit(self, compute_objective, x):
+        # Runs immediately and hands back an already finished future
+        future = Future()
+        try:
+            future.set_result(compute_objective(x))
+        except Exception as exception:
+            future.set_exception(exception)
+        return future
+
+    def shutdown(self):
+        pass
+
+
+class PoolEvaluator(object):
+    # Shared base for thread and process pools (concurrent.futures)
+    executor_class = None
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self._pool = None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = self.executor_class(max_workers=self.max_workers)
+        return self._pool
+
+    def map(self, compute_objective, samples):
+        futures = [self.pool.submit(compute_objective, x) for x in samples]
+        return [f.result() for f in futures]
+
+    def submit(self, compute_objective, x):
+        return self.pool.submit(compute_objective, x)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+class ThreadEvaluator(PoolEvaluator):
+    # Enough when compute_objective spends its time waiting on the simulator
+    executor_class = ThreadPoolExecutor
+
+
+class ProcessEvaluator(PoolEvaluator):
+    # compute_objective and the samples must be picklable
+    executor_class = ProcessPoolExecutor
+
+
+class CarlaPoolEvaluator(object):
+    '''
+    One worker per CARLA server. make_objective(host, port) is called once per
+    server, lazily, and must return a compute_objective bound to that server
+    (e.g. wrapping its own ScenarioRunner). A sample is dispatched to whichever
+    server is free first.
+
+    hosts: list of (host, port) tuples
+    '''
+    def __init__(self, hosts, make_objective):
+        self.hosts = list(hosts)
+        self.make_objective = make_objective
+        self._objectives = {}
+        self._free = queue.Queue()
+        for slot in range(len(self.hosts)):
+            self._free.put(slot)
+        self._pool = ThreadPoolExecutor(max_workers=len(self.hosts))
+
+    def _get_objective(self, slot):
+        # A slot is held by one thread at a time, so no lock is needed here
+        if slot not in self._objectives:
+            host, port = self.hosts[slot]
+            self._objectives[slot] = self.make_objective(host, port)
+        return self._objectives[slot]
+
+    def _run(self, x):
+        slot = self._free.get()
+        try:
+            return self._get_objective(slot)(x)
+        finally:
+            self._free.put(slot)
+
+    def map(self, compute_objective, samples):
+        # compute_objective is ignored: each server uses its own bound objective
+        futures = [self._pool.submit(self._run, x) for x in samples]
+        return [f.result() for f in futures]
+
+    def submit(self, compute_objective, x):
+        return self._pool.submit(self._run, x)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+
+# Backends that can be built from their name alone. CarlaPoolEvaluator needs
+# the server list and an objective factory, so it is passed as an instance:
+#   runFunc(..., executor=CarlaPoolEvaluator(hosts, make_objective))
+EVALUATORS = {
+    'serial': SerialEvaluator,
+    'thread': ThreadEvaluator,
+    'process': ProcessEvaluator,
+}
+
+
+def get_evaluator(executor=None, **kwargs):
+    # executor: None, one of EVALUATORS keys or an evaluator instance
+    if executor is None:
+        return SerialEvaluator()
+    if isinstance(executor, str):
+        if executor == 'carla':
+            raise ValueError('The carla executor needs its servers: pass '
+                             'CarlaPoolEvaluator(hosts, make_objective) instead of a string')
+        if executor not in EVALUATORS:
+            raise ValueError('Unknown executor: %s' % executor)
+        return EVALUATORS[executor](**kwargs)
+    return executor
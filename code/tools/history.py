@@ -0,0 +1,77 @@
+import numpy as np
+
+from tools import run_log
+
+#==============================================================================
+# Bounded-memory history storage for long annealing campaigns
+# (runFunc(..., storage='stream')).
+#
+# Every step is already streamed to the run log (tools.run_log); in memory
+# only a ring buffer of the most recent steps is kept, older rows are read
+# back from the memory-mapped log on demand.
+#==============================================================================
+class RingHistory(object):
+    def __init__(self, folder, field, row_shape, size=64):
+        # field: run log field the older rows are read back from
+        self.folder = folder
+        self.field = field
+        self.size = size
+        self.data = np.zeros((size,) + tuple(row_shape))
+        self.latest = -1
+        self._log = None
+
+    def __setitem__(self, i, value):
+        self.data[i % self.size] = value
+        self.latest = max(self.latest, i)
+
+    def _row(self, i):
+        if i < 0:
+            i += self.latest + 1
+        if i > self.latest:
+            raise IndexError('step %i not recorded yet' % i)
+        if self.latest - i < self.size:
+            return self.data[i % self.size]
+        if self._log is None or len(self._log) <= i:
+            self._log = run_log.read_log(self.folder)
+        return self._log[self.field][i]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            steps = range(*i.indices(self.latest + 1))
+            return np.array([self._row(k) for k in steps]).reshape((len(steps),) + self.data.shape[1:])
+        return self._row(i)
+
+    def __len__(self):
+        return self.latest + 1
+
+
+class AcceptFlags(object):
+    # Lazy, list-like view of the bit-packed accept flags in a run log
+    def __init__(self, log, num_simult_runs):
+        self.log = log
+        self.num_simult_runs = num_simult_runs
+
+    def __len__(self):
+        return len(self.log)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return run_log.unpack_accept(self.log['accept'][i], self.num_simult_runs)
+        if i < 0:
+            i += len(self)
+        if i == 0:
+            # the initial samples are always accepted
+            return np.full((1, self.num_simult_runs), True)
+        return run_log.unpack_accept(self.log['accept'][i], self.num_simult_runs)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def lazy_histories(folder, nsteps):
+    # Histories in the order returned by runFunc, as views into the run log
+    log = run_log.read_log(folder)[:nsteps+1]
+    n = log['f'].shape[1]
+    return (log['best_x'], log['best_f'], log['x'], log['f'], log['accept_x'],
+            AcceptFlags(log, n))
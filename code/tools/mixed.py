@@ -0,0 +1,133 @@
+import numpy as np
+
+from tools import sampling
+from tools.optimizers import AnnealingOptimizer
+
+#==============================================================================
+# Mixed discrete/continuous search.
+#
+# A point is one float vector with the continuous RSS parameters first, then
+# the integer dimensions, then the categorical ones stored as choice indices:
+#
+#   space = MixedSpace(names, RssParamsInit().getSpace(names),
+#                      integers=[('ego_target_speed', 20, 40)],
+#                      categoricals=[('scenario', ['Rss_Ext_FI_a', 'Rss_Ext_FI_b']),
+#                                    ('other_0_model', ['vehicle.audi.a2', 'vehicle.tesla.model3'])])
+#   optimizer = MixedAnnealing(space.sample(16), space)
+#   optimizers.optimize(optimizer, lambda x: runner.evaluate(args, space.decode(x)), ngen)
+#
+# The batch of every round is simulated grouped by its categorical part
+# (see MixedAnnealing.evaluation_order). ScenarioRunner.evaluate caches the
+# parsed configuration per group and only reloads the world when the town
+# changes; the actors themselves are respawned for every run.
+#==============================================================================
+class MixedSpace(object):
+    def __init__(self, names, space, integers=(), categoricals=()):
+        # names, space: continuous parameters and their (xdim, 2) bounds
+        # integers: (name, lower, upper) with inclusive bounds
+        # categoricals: (name, choices)
+        self.continuous = list(names)
+        self.integers = [name for name, _, _ in integers]
+        self.categoricals = [name for name, _ in categoricals]
+        self.choices = [list(choices) for _, choices in categoricals]
+        self.names = self.continuous + self.integers + self.categoricals
+
+        self.nc = len(self.continuous)
+        self.ni = len(self.integers)
+        self.nk = len(self.categoricals)
+        bounds = [np.asarray(space, dtype=float).reshape(-1, 2)]
+        bounds.append(np.array([[lower, upper] for _, lower, upper in integers], dtype=float).reshape(-1, 2))
+        bounds.append(np.array([[0, len(c)-1] for c in self.choices], dtype=float).reshape(-1, 2))
+        self.space = np.vstack(bounds)
+
+        # hit-and-run runs on the continuous and integer columns together,
+        # integers relaxed to +-0.5 around their range and rounded afterwards
+        self._walk_space = self.space[:self.nc+self.ni].copy()
+        self._walk_space[self.nc:, 0] -= 0.5 - 1e-9
+        self._walk_space[self.nc:, 1] += 0.5 - 1e-9
+
+    @property
+    def xdim(self):
+        return self.space.shape[0]
+
+    def sample(self, n):
+        X = np.random.uniform(self.space[:,0], self.space[:,1], size=(n, self.xdim))
+        X[:, self.nc:] = np.random.randint(self.space[self.nc:, 0], self.space[self.nc:, 1] + 1,
+                                           size=(n, self.ni + self.nk))
+        return X
+
+    def encode(self, params):
+        # dict (as returned by decode) -> point
+        x = np.empty(self.xdim)
+        for i, name in enumerate(self.continuous + self.integers):
+            x[i] = params[name]
+        for k, name in enumerate(self.categoricals):
+            x[self.nc + self.ni + k] = self.choices[k].index(params[name])
+        return x
+
+    def decode(self, x):
+        # point -> {name: value} with ints for integer and the choice itself
+        # for categorical dimensions
+        params = {}
+        for i, name in enumerate(self.continuous):
+            params[name] = float(x[i])
+        for i, name in enumerate(self.integers):
+            params[name] = int(round(x[self.nc + i]))
+        for k, name in enumerate(self.categoricals):
+            params[name] = self.choices[k][int(round(x[self.nc + self.ni + k]))]
+        return params
+
+    def key(self, x):
+        # categorical part of a point: points with equal keys share a world
+        return tuple(int(round(c)) for c in np.asarray(x)[self.nc + self.ni:])
+
+    def group(self, X):
+        # {key: indices} of a batch, in first-seen order
+        groups = {}
+        for j, x in enumerate(X):
+            groups.setdefault(self.key(x), []).append(j)
+        return groups
+
+    def propose(self, X, p_categorical=0.2):
+        # Per chain either switch one categorical dimension to another choice
+        # (probability p_categorical) or do a hit-and-run step on the numeric
+        # dimensions with the categorical part fixed
+        X = np.asarray(X, dtype=float)
+        n = X.shape[0]
+        nextX = np.copy(X)
+        walk = np.ones(n, dtype=bool)
+        if self.nk:
+            switchable = [k for k in range(self.nk) if len(self.choices[k]) > 1]
+            if switchable:
+                walk = np.random.uniform(size=n) >= p_categorical
+                for j in np.nonzero(~walk)[0]:
+                    k = switchable[np.random.randint(len(switchable))]
+                    col = self.nc + self.ni + k
+                    other = np.random.randint(len(self.choices[k]) - 1)
+                    nextX[j, col] = other + (other >= X[j, col])
+        if self.nc + self.ni and np.any(walk):
+            numeric = sampling.get_next_samples(X[walk, :self.nc+self.ni], self._walk_space)
+            numeric[:, self.nc:] = np.round(numeric[:, self.nc:])
+            nextX[walk, :self.nc+self.ni] = numeric
+        return nextX
+
+
+class MixedAnnealing(AnnealingOptimizer):
+    '''
+    AnnealingOptimizer over a MixedSpace: the same acceptance and schedules,
+    with proposals from MixedSpace.propose.
+    '''
+    def __init__(self, currentSamples, space, schedule=None, p_categorical=0.2):
+        super(MixedAnnealing, self).__init__(currentSamples, space.space, schedule=schedule)
+        self.mixed = space
+        self.p_categorical = p_categorical
+
+    def propose(self, X):
+        return self.mixed.propose(X, self.p_categorical)
+
+    def evaluation_order(self, X):
+        # stable sort on the categorical part, one world reload per group
+        keys = np.round(np.asarray(X)[:, self.mixed.nc + self.mixed.ni:]).astype(int)
+        if keys.shape[1] == 0:
+            return np.arange(len(X))
+        return np.lexsort(keys.T[::-1])
@@ -0,0 +1,202 @@
+import os
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+
+#==============================================================================
+# Memoizing wrapper around compute_objective.
+#
+# Results are keyed on (scenario, variant, quantized parameter vector) and
+# kept in an in-memory LRU in front of a sqlite file, so repeated campaigns
+# reuse simulations from earlier ones.
+#
+# Usage:
+#   x, space = RssParamsInit().getInit(names, **init)
+#   compute_objective = ObjectiveCache(compute_objective, names, space,
+#                                      'Rss_Ext_FI', variant='a', folder=RES_FOLDER,
+#                                      resolution={'response_time': 0.01})
+#==============================================================================
+DB_NAME = 'objective_cache.sqlite'
+
+
+class ObjectiveCache(object):
+    def __init__(self, compute_objective, names, space, scenario, variant='', folder=None,
+                 resolution=None, rel_resolution=1e-3, memory_size=4096, max_entries=None):
+        # space: (xdim, 2) bounds as returned by RssParamsInit.getInit
+        # resolution: absolute quantization step per parameter name, defaults
+        #   to rel_resolution times the parameter range
+        # max_entries: evict least recently used entries from disk beyond this
+        self.compute_objective = compute_objective
+        self.names = list(names)
+        self.space = np.asarray(space, dtype=float)
+        self.scenario = scenario
+        self.variant = variant
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+
+        resolution = resolution or {}
+        widths = self.space[:,1] - self.space[:,0]
+        self.steps = np.array([resolution.get(name, rel_resolution*width)
+                               for name, width in zip(self.names, widths)], dtype=float)
+
+        self.filename = os.path.join(folder, DB_NAME) if folder else None
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = None
+
+    # sqlite connections and locks do not pickle (process evaluators);
+    # each process reopens the same file
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_db'] = None
+        state['_lock'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def db(self):
+        if self._db is None and self.filename:
+            self._db = sqlite3.connect(self.filename, timeout=60, check_same_thread=False)
+            self._db.execute('CREATE TABLE IF NOT EXISTS cache '
+                             '(key TEXT PRIMARY KEY, value TEXT, last_access INTEGER)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS cache_access ON cache (last_access)')
+            self._db.commit()
+        return self._db
+
+    def quantize(self, x):
+        return tuple(int(q) for q in np.round((np.asarray(x, dtype=float) - self.space[:,0])/self.steps))
+
+    def key(self, x):
+        # names are part of the key so that differently ordered or sized
+        # parameter sets never collide
+        return json.dumps([self.scenario, self.variant, self.names, self.quantize(x)])
+
+    def _remember(self, key, value):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def _disk_get(self, key):
+        if self.db is None:
+            return None
+        row = self.db.execute('SELECT value FROM cache WHERE key=?', (key,)).fetchone()
+        if row is None:
+            return None
+        self.db.execute('UPDATE cache SET last_access=(SELECT IFNULL(MAX(last_access), 0)+1 FROM cache) '
+                        'WHERE key=?', (key,))
+        self.db.commit()
+        return decode(row[0])
+
+    def _disk_put(self, key, value):
+        if self.db is None:
+            return
+        self.db.execute('INSERT OR REPLACE INTO cache VALUES '
+                        '(?, ?, (SELECT IFNULL(MAX(last_access), 0)+1 FROM cache))', (key, encode(value)))
+        if self.max_entries is not None:
+            self.db.execute('DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                            'ORDER BY last_access DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+        self.db.commit()
+
+    def lookup(self, x):
+        # Cached value for x or None, without running the simulation
+        key = self.key(x)
+        with self._lock:
+            if key in self.memory:
+                self.hits += 1
+                self.memory.move_to_end(key)
+                return self.memory[key]
+            value = self._disk_get(key)
+            if value is not None:
+                self.hits += 1
+                self.disk_hits += 1
+                self._remember(key, value)
+            return value
+
+    def store(self, x, value):
+        key = self.key(x)
+        with self._lock:
+            self._remember(key, value)
+            self._disk_put(key, value)
+
+    def store_many(self, X, values, disk=True):
+        # Bulk insert (e.g. prior results), one transaction; with disk=False
+        # only the in-memory LRU is filled
+        keys = [self.key(x) for x in X]
+        with self._lock:
+            for key, value in zip(keys, values):
+                self._remember(key, value)
+            if disk and self.db is not None:
+                self.db.executemany('INSERT OR REPLACE INTO cache VALUES '
+                                    '(?, ?, (SELECT IFNULL(MAX(last_access), 0)+1 FROM cache))',
+                                    [(key, encode(value)) for key, value in zip(keys, values)])
+                self.db.commit()
+
+    def entries(self):
+        # All cached (x, value) of this scenario, variant and parameter set,
+        # x at the quantization grid points
+        prefix = [self.scenario, self.variant, self.names]
+        rows = {}
+        if self.db is not None:
+            with self._lock:
+                for key, value in self.db.execute('SELECT key, value FROM cache'):
+                    rows[key] = decode(value)
+        rows.update(self.memory)
+        X, values = [], []
+        for key, value in rows.items():
+            fields = json.loads(key)
+            if fields[:3] == prefix:
+                X.append(self.space[:,0] + np.asarray(fields[3], dtype=float)*self.steps)
+                values.append(value)
+        return np.array(X).reshape(-1, len(self.names)), values
+
+    def __call__(self, x):
+        value = self.lookup(x)
+        if value is None:
+            with self._lock:
+                self.misses += 1
+            value = self.compute_objective(x)
+            self.store(x, value)
+        return value
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': float(self.hits)/total if total else 0.0,
+            'memory_entries': len(self.memory),
+        }
+
+    def print_stats(self):
+        s = self.stats()
+        print('OBJECTIVE CACHE: %i hits (%i from disk), %i misses, hit rate %.3f'
+              % (s['hits'], s['disk_hits'], s['misses'], s['hit_rate']))
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+def encode(value):
+    # objectives are floats or tuples of floats (e.g. getRobustnessEtc)
+    if np.ndim(value) == 0:
+        return json.dumps(float(value))
+    return json.dumps([float(v) for v in value])
+
+
+def decode(text):
+    value = json.loads(text)
+    if isinstance(value, list):
+        return tuple(value)
+    return value
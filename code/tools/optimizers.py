@@ -0,0 +1,261 @@
+from collections import deque
+import numpy as np
+from numpy import linalg as LA
+
+from tools import evaluators
+from tools import sampling
+from tools import schedules
+
+#==============================================================================
+# Common ask/tell interface for the search engines.
+#
+#   X = optimizer.ask()          # (batch, xdim), simulated in parallel
+#   optimizer.tell(X, f)         # objective values in the same order
+#   x, f = optimizer.best()
+#
+# optimize() drives any optimizer through a tools.evaluators backend and
+# tools.stopping criteria, like runFunc does for annealing.
+#==============================================================================
+class Optimizer(object):
+    def __init__(self, space):
+        self.space = np.asarray(space, dtype=float)
+        self.xdim = self.space.shape[0]
+        self.best_x = None
+        self.best_f = np.inf
+
+    def ask(self):
+        raise NotImplementedError
+
+    def tell(self, X, f):
+        raise NotImplementedError
+
+    def best(self):
+        return self.best_x, self.best_f
+
+    def chain_best(self):
+        # Best objective per chain/population member, one row of best_f_history
+        return np.atleast_1d(self.best_f)
+
+    def evaluation_order(self, X):
+        # Order in which optimize() simulates a batch (results are put back
+        # in ask order), e.g. to group points sharing a world
+        return np.arange(len(X))
+
+    def _update_best(self, X, f):
+        j = np.argmin(f)
+        if f[j] < self.best_f:
+            self.best_f = float(f[j])
+            self.best_x = np.copy(X[j])
+
+
+class AnnealingOptimizer(Optimizer):
+    '''
+    Hit-and-run annealing as an ask/tell optimizer; runFunc drives this class
+    too, adding run logs, checkpoints and history storage around it. The
+    first ask returns the initial samples, every later one a proposal per
+    chain. With a surrogate (tools.surrogate.GPSurrogate) each proposal is
+    the best of surrogate.n_candidates, the surrogate being refit on the
+    last max_points evaluations before every ask.
+    '''
+    def __init__(self, currentSamples, space, schedule=None, constraints=None, surrogate=None):
+        super(AnnealingOptimizer, self).__init__(space)
+        sampling.check_feasible(currentSamples, space, constraints)
+        self.currentSamples = np.array(currentSamples, dtype=float)
+        self.n = self.currentSamples.shape[0]
+        self.constraints = constraints
+        self.schedule = schedules.get_schedule(schedule)
+        self.surrogate = surrogate
+        self.objectives = None
+        self.solutions = None
+        self.sol_x = np.copy(self.currentSamples)
+        self.step = 0
+        # results of the last tell: accept flags and surrogate errors (or None)
+        self.accepts = None
+        self.surrogate_error = None
+        self._predicted = None
+        # evaluated batches the surrogate is fit on
+        self._recent = deque(maxlen=(surrogate.max_points//self.n + 1) if surrogate is not None else 0)
+
+    def propose(self, X):
+        # one proposal per row of X
+        return sampling.get_next_samples(X, self.space, self.constraints)
+
+    def ask(self):
+        self._predicted = None
+        if self.objectives is None:
+            return np.copy(self.currentSamples)
+        if self.surrogate is not None and self.surrogate.fit([X for X, _ in self._recent],
+                                                             [f for _, f in self._recent]):
+            k = self.surrogate.n_candidates
+            candidates = self.propose(np.repeat(self.currentSamples, k, axis=0))
+            X, self._predicted = self.surrogate.select(candidates.reshape(self.n, k, self.xdim))
+            return X
+        return self.propose(self.currentSamples)
+
+    def remember(self, X, f):
+        # an evaluated batch for the surrogate (tell does this; runFunc also
+        # on resume, for the steps before the checkpoint)
+        self._recent.append((np.array(X, dtype=float), np.array(f, dtype=float)))
+
+    def tell(self, X, f):
+        X = np.asarray(X, dtype=float)
+        f = np.asarray(f, dtype=float)
+        self.remember(X, f)
+        self.surrogate_error = None
+        if self.objectives is None:
+            self.objectives = np.copy(f)
+            self.solutions = np.copy(f)
+            self.accepts = np.full(self.n, True)
+        else:
+            if self._predicted is not None:
+                self.surrogate.record_error(self._predicted, f)
+                self.surrogate_error = self.surrogate.errors[-1]
+            temperature = self.schedule.temperature(self.step)
+            accepts = sampling.accept_values(f, self.objectives, temperature)
+            self.currentSamples[accepts] = X[accepts]
+            self.objectives[accepts] = f[accepts]
+            self.schedule.update(accepts)
+            self.schedule.exchange(self.step, self.currentSamples, self.objectives)
+            self.accepts = accepts
+            self.step += 1
+        improved = self.objectives < self.solutions
+        self.solutions[improved] = self.objectives[improved]
+        self.sol_x[improved] = self.currentSamples[improved]
+        self._update_best(X, f)
+
+    def get_state(self):
+        # keyword arguments of run_log.save_checkpoint
+        return dict(step=self.step, currentSamples=self.currentSamples, objectives=self.objectives,
+                    solutions=self.solutions, sol_x=self.sol_x, schedule=self.schedule.get_state())
+
+    def set_state(self, state):
+        # inverse of get_state (e.g. a run_log.load_checkpoint result)
+        self.step = state['step']
+        self.currentSamples = np.array(state['currentSamples'], dtype=float)
+        self.objectives = np.array(state['objectives'], dtype=float)
+        self.solutions = np.array(state['solutions'], dtype=float)
+        self.sol_x = np.array(state['sol_x'], dtype=float)
+        self.schedule.set_state(state['schedule'])
+        self._update_best(self.sol_x, self.solutions)
+
+    def chain_best(self):
+        return np.copy(self.solutions)
+
+
+class CMAES(Optimizer):
+    '''
+    (mu/mu_w, lambda)-CMA-ES (Hansen's tutorial defaults) in the unit box of
+    space. Samples outside the box are clipped before being simulated and
+    ranked with a quadratic penalty on the clipping distance, while the
+    unclipped samples drive the update.
+
+    x0: initial mean (default: centre of space); sigma0 in unit box units
+    '''
+    def __init__(self, space, x0=None, sigma0=0.3, popsize=None, penalty=1e3):
+        super(CMAES, self).__init__(space)
+        N = self.xdim
+        self.lo = self.space[:,0]
+        self.width = self.space[:,1] - self.space[:,0]
+        self.mean = 0.5*np.ones(N) if x0 is None else (np.asarray(x0, dtype=float) - self.lo)/self.width
+        self.sigma = sigma0
+        self.penalty = penalty
+
+        self.lam = popsize or 4 + int(3*np.log(N))
+        self.mu = self.lam//2
+        w = np.log(self.mu + 0.5) - np.log(np.arange(1, self.mu+1))
+        self.weights = w/np.sum(w)
+        self.mueff = 1.0/np.sum(self.weights**2)
+
+        self.cc = (4 + self.mueff/N)/(N + 4 + 2*self.mueff/N)
+        self.cs = (self.mueff + 2)/(N + self.mueff + 5)
+        self.c1 = 2/((N + 1.3)**2 + self.mueff)
+        self.cmu = min(1 - self.c1, 2*(self.mueff - 2 + 1/self.mueff)/((N + 2)**2 + self.mueff))
+        self.damps = 1 + 2*max(0, np.sqrt((self.mueff - 1)/(N + 1)) - 1) + self.cs
+        self.chiN = np.sqrt(N)*(1 - 1./(4*N) + 1./(21*N**2))
+
+        self.pc = np.zeros(N)
+        self.ps = np.zeros(N)
+        self.B = np.eye(N)
+        self.D = np.ones(N)
+        self.C = np.eye(N)
+        self.invsqrtC = np.eye(N)
+        self.generation = 0
+        self._eigen_generation = 0
+        self._samples = None
+
+    def _update_eigen(self):
+        # O(N^3), only every few generations as in the reference implementation
+        if self.generation - self._eigen_generation > self.lam/(self.c1 + self.cmu)/self.xdim/10:
+            self._eigen_generation = self.generation
+            self.C = np.triu(self.C) + np.triu(self.C, 1).T
+            D2, self.B = LA.eigh(self.C)
+            self.D = np.sqrt(np.maximum(D2, 1e-20))
+            self.invsqrtC = self.B.dot(np.diag(1/self.D)).dot(self.B.T)
+
+    def ask(self):
+        self._update_eigen()
+        z = np.random.normal(size=(self.lam, self.xdim))
+        self._samples = self.mean + self.sigma*(z*self.D).dot(self.B.T)
+        return self.lo + np.clip(self._samples, 0.0, 1.0)*self.width
+
+    def tell(self, X, f):
+        f = np.asarray(f, dtype=float)
+        self._update_best(X, f)
+        u = self._samples
+        ranked = f + self.penalty*np.sum((u - np.clip(u, 0.0, 1.0))**2, axis=1)
+        ranked = np.where(np.isfinite(ranked), ranked, np.inf)
+        selected = u[np.argsort(ranked)[:self.mu]]
+
+        N = self.xdim
+        old = self.mean
+        self.mean = self.weights.dot(selected)
+        step = (self.mean - old)/self.sigma
+        self.ps = (1 - self.cs)*self.ps + np.sqrt(self.cs*(2 - self.cs)*self.mueff)*self.invsqrtC.dot(step)
+        self.generation += 1
+        hsig = (LA.norm(self.ps)/np.sqrt(1 - (1 - self.cs)**(2*self.generation))/self.chiN
+                < 1.4 + 2./(N + 1))
+        self.pc = (1 - self.cc)*self.pc + hsig*np.sqrt(self.cc*(2 - self.cc)*self.mueff)*step
+
+        artmp = (selected - old)/self.sigma
+        self.C = ((1 - self.c1 - self.cmu)*self.C
+                  + self.c1*(np.outer(self.pc, self.pc) + (1 - hsig)*self.cc*(2 - self.cc)*self.C)
+                  + self.cmu*(artmp.T*self.weights).dot(artmp))
+        self.sigma *= np.exp((self.cs/self.damps)*(LA.norm(self.ps)/self.chiN - 1))
+
+
+def optimize(optimizer, compute_objective, ngen, executor=None, stop=()):
+    '''
+    ngen ask/evaluate/tell rounds. Returns best_x_history (list of the best
+    point after each round), best_f_history (rounds, chains), x_history
+    and f_history (lists of the evaluated batches).
+    '''
+    evaluator = evaluators.get_evaluator(executor)
+    for criterion in stop:
+        criterion.start()
+
+    best_x_history, best_f_history, x_history, f_history = [], [], [], []
+    for g in range(ngen):
+        if g > 0:
+            reason = None
+            for criterion in stop:
+                reason = reason or criterion.check(g-1, best_f_history)
+            if reason:
+                print('STOPPED AFTER %i ROUNDS: %s' % (g, reason))
+                break
+        X = optimizer.ask()
+        # simulated in evaluation_order, handed back in ask order (scalar
+        # or vector objectives, e.g. for ParetoAnnealing)
+        order = optimizer.evaluation_order(X)
+        f = np.asarray(evaluator.map(compute_objective, X[order]), dtype=float)[np.argsort(order)]
+        for criterion in stop:
+            criterion.consume(len(X))
+        optimizer.tell(X, f)
+
+        x_history.append(X)
+        f_history.append(f)
+        best_x_history.append(np.copy(optimizer.best()[0]))
+        best_f_history.append(optimizer.chain_best())
+
+    if evaluator is not executor:
+        evaluator.shutdown()
+    return best_x_history, np.array(best_f_history), x_history, f_history
@@ -0,0 +1,151 @@
+import numpy as np
+
+from tools import sampling
+from tools.optimizers import Optimizer
+
+#==============================================================================
+# Multi-objective falsification.
+#
+# compute_objective returns a vector of objectives, all minimized, e.g.
+#   rob, collision, progress, comfort = robustness.getObjectives(file_name)
+#   return rob, -collision, -progress
+# ParetoArchive keeps the non-dominated evaluations incrementally and
+# ParetoAnnealing spreads its chains over the front by giving every chain
+# its own Chebyshev scalarization.
+#==============================================================================
+def dominates(a, b):
+    # a dominates b (minimization)
+    return bool(np.all(a <= b) and np.any(a < b))
+
+
+class ParetoArchive(object):
+    '''
+    Non-dominated set, updated one point at a time: an insertion is one
+    vectorized dominance test against the current front (O(n*m)), nothing
+    is ever re-sorted. F and X are array views of the front for plotting.
+    '''
+    def __init__(self, nobj, xdim, capacity=64):
+        self._F = np.empty((capacity, nobj))
+        self._X = np.empty((capacity, xdim))
+        self.size = 0
+        self.insertions = 0
+
+    @property
+    def F(self):
+        return self._F[:self.size]
+
+    @property
+    def X(self):
+        return self._X[:self.size]
+
+    def __len__(self):
+        return self.size
+
+    def insert(self, x, f):
+        # Returns True if (x, f) entered the front
+        f = np.asarray(f, dtype=float)
+        if not np.all(np.isfinite(f)):
+            return False
+        F = self.F
+        if self.size:
+            # rejected if some member is at least as good everywhere
+            if np.any(np.all(F <= f, axis=1)):
+                return False
+            keep = ~np.all(f <= F, axis=1)
+            if not np.all(keep):
+                n = int(np.sum(keep))
+                self._F[:n] = F[keep]
+                self._X[:n] = self.X[keep]
+                self.size = n
+        if self.size == self._F.shape[0]:
+            self._F = np.vstack((self._F, np.empty_like(self._F)))
+            self._X = np.vstack((self._X, np.empty_like(self._X)))
+        self._F[self.size] = f
+        self._X[self.size] = x
+        self.size += 1
+        self.insertions += 1
+        return True
+
+    def insert_batch(self, X, F):
+        return np.array([self.insert(x, f) for x, f in zip(X, F)], dtype=bool)
+
+    def ideal(self):
+        return np.min(self.F, axis=0)
+
+    def nadir(self):
+        return np.max(self.F, axis=0)
+
+    def sorted_by(self, k=0):
+        # Front ordered along objective k (for line plots of 2-D fronts)
+        order = np.argsort(self.F[:, k])
+        return self.X[order], self.F[order]
+
+    def hypervolume(self, reference):
+        # Exact for two objectives only
+        if self.F.shape[1] != 2:
+            raise ValueError('hypervolume is only implemented for 2 objectives')
+        _, F = self.sorted_by(0)
+        F = F[np.all(F < reference, axis=1)]
+        if F.shape[0] == 0:
+            return 0.0
+        widths = np.diff(np.append(F[:, 0], reference[0]))
+        return float(np.sum(widths*(reference[1] - F[:, 1])))
+
+
+def chebyshev_weights(num_simult_runs, nobj):
+    # Spread weight vectors, one per chain (first chains on the axes)
+    W = np.random.dirichlet(np.ones(nobj), size=num_simult_runs)
+    for k in range(min(nobj, num_simult_runs)):
+        W[k] = 0.01/(nobj - 1) if nobj > 1 else 1.0
+        W[k, k] = 0.99 if nobj > 1 else 1.0
+    return W
+
+
+class ParetoAnnealing(Optimizer):
+    '''
+    Hit-and-run annealing over vector objectives (ask/tell, see
+    tools.optimizers). Chain j accepts moves on the Chebyshev scalarization
+    max_k w_jk (f_k - ideal_k)/(nadir_k - ideal_k) with the ideal and nadir
+    points of the archive, so the chains cover different parts of the front.
+    All evaluations go through the archive.
+    '''
+    def __init__(self, currentSamples, space, nobj, weights=None, tsched=100., constraints=None):
+        super(ParetoAnnealing, self).__init__(space)
+        sampling.check_feasible(currentSamples, space, constraints)
+        self.currentSamples = np.array(currentSamples, dtype=float)
+        self.constraints = constraints
+        n = self.currentSamples.shape[0]
+        self.weights = chebyshev_weights(n, nobj) if weights is None else np.asarray(weights, dtype=float)
+        self.archive = ParetoArchive(nobj, self.xdim)
+        self.tsched = tsched
+        self.current_F = None
+        self.step = 0
+
+    def scalarize(self, F):
+        ideal = self.archive.ideal()
+        scale = np.maximum(self.archive.nadir() - ideal, 1e-12)
+        return np.max(self.weights*(np.asarray(F) - ideal)/scale, axis=1)
+
+    def ask(self):
+        if self.current_F is None:
+            return np.copy(self.currentSamples)
+        return sampling.get_next_samples(self.currentSamples, self.space, self.constraints)
+
+    def tell(self, X, F):
+        F = np.asarray(F, dtype=float)
+        self.archive.insert_batch(X, F)
+        if self.current_F is None:
+            self.current_F = np.copy(F)
+        else:
+            temperature = self.step*(1./self.tsched)
+            accepts = sampling.accept_values(self.scalarize(F), self.scalarize(self.current_F), temperature)
+            self.currentSamples[accepts] = X[accepts]
+            self.current_F[accepts] = F[accepts]
+            self.step += 1
+
+    def best(self):
+        return self.archive.X, self.archive.F
+
+    def chain_best(self):
+        # current scalarized value per chain (for stopping criteria)
+        return self.scalarize(self.current_F)
@@ -1,21 +1,19 @@
 import csv
+import numpy as np
 
-IDX_rob = 0
-IDX_collision = 1
-IDX_ego_velocity = 2
-
+from tools import trajectory
 
 def distance(x, thr):
 	# POSITIVE (TRUE) if x>=thr
-    return [x-thr for x in x]
+    return np.asarray(x, dtype=float) - thr
 
 
 def always(x):
-    return min(x)
+    return float(np.min(x))
 
 
 def eventually(x):
-    return max(x)
+    return float(np.max(x))
 
 
 def alwaysDistance(x, thr=0.0):
@@ -44,9 +42,15 @@ def evaluateRobustness(traj):
     return rob
 
 
+def readColumns(file_name):
+    # {name: column} of a binary trajectory (tools.trajectory, memory-mapped)
+    # or of a CSV one (trajectory.LEGACY_CSV_COLUMNS)
+    return trajectory.load_columns(file_name)
+
+
 def getRobustness(file_name):
-    data = readFile(file_name)
-    traj_rob = column(data, IDX_rob)
+    data = readColumns(file_name)
+    traj_rob = data['distance']
     rob = evaluateRobustness(traj_rob)
     print('ROBUSTNESS = %.3f' % rob)
     print('\n\n#########################')
@@ -56,12 +60,150 @@ def getRobustness(file_name):
 
 
 def getRobustnessEtc(file_name):
-    data = readFile(file_name)
+    data = readColumns(file_name)
     
-    traj_rob = column(data, IDX_rob)
-    traj_collision = column(data, IDX_collision)
+    traj_rob = data['distance']
+    traj_collision = data['collision']
     
     rob = evaluateRobustness(traj_rob)
-    collision = max(traj_collision)
+    collision = int(np.max(traj_collision))
     print('ROBUSTNESS = %.3f, COLLISION = %i' % (rob, collision))
-    return rob, collision
\ No newline at end of file
+    return rob, collision
+
+
+def getObjectives(file_name):
+    # Robustness, collision, ego progress (mean velocity) and ego comfort
+    # (largest velocity change between frames) for multi-objective search
+    data = readColumns(file_name)
+
+    traj_rob = data['distance']
+    traj_collision = data['collision']
+    traj_ego_velocity = np.asarray(data['ego_velocity'], dtype=float)
+
+    rob = evaluateRobustness(traj_rob)
+    collision = int(np.max(traj_collision))
+    progress = float(np.mean(traj_ego_velocity))
+    comfort = float(np.max(np.abs(np.diff(traj_ego_velocity)), initial=0.0))
+    print('ROBUSTNESS = %.3f, COLLISION = %i, PROGRESS = %.3f, COMFORT = %.3f' % (rob, collision, progress, comfort))
+    return rob, collision, progress, comfort
+
+
+#==============================================================================
+# Online monitoring: the same quantities updated tick by tick in O(1), so
+# the objective is known the moment the scenario ends (no file round trip).
+#==============================================================================
+class OnlineRobustness(object):
+    '''
+    Running always/eventually over distance(x, thr). signal_min/signal_max
+    bound the raw signal (e.g. a distance is never negative): once the
+    running value reaches the bound no later tick can change it (decided);
+    the sign can no longer change once always is negative or eventually
+    positive (verdict_decided). settle() lets the caller pass a bound on
+    all future raw values (e.g. from bounded dynamics) that can decide the
+    value earlier.
+    '''
+    def __init__(self, operator='always', thr=0.0, signal_min=None, signal_max=None):
+        if operator not in ('always', 'eventually'):
+            raise ValueError('Unknown operator: %s' % operator)
+        self.operator = operator
+        self.thr = thr
+        self.rob_min = -float('Inf') if signal_min is None else signal_min - thr
+        self.rob_max = float('Inf') if signal_max is None else signal_max - thr
+        self.value = None
+        self.samples = 0
+        self.settled = False
+
+    def update(self, x):
+        rob = x - self.thr
+        if self.value is None:
+            self.value = rob
+        elif self.operator == 'always':
+            self.value = min(self.value, rob)
+        else:
+            self.value = max(self.value, rob)
+        self.samples += 1
+        return self.value
+
+    def settle(self, future_bound):
+        # future_bound: lower (always) or upper (eventually) bound on every
+        # raw value still to come
+        if self.value is None:
+            return False
+        rob = future_bound - self.thr
+        if self.operator == 'always':
+            self.settled = self.settled or rob >= self.value
+        else:
+            self.settled = self.settled or rob <= self.value
+        return self.settled
+
+    @property
+    def decided(self):
+        if self.value is None:
+            return False
+        if self.settled:
+            return True
+        if self.operator == 'always':
+            return self.value <= self.rob_min
+        return self.value >= self.rob_max
+
+    @property
+    def verdict_decided(self):
+        if self.value is None:
+            return False
+        if self.operator == 'always':
+            return self.value < 0
+        return self.value > 0
+
+
+class OnlineObjectives(object):
+    '''
+    getObjectives computed while the scenario runs: feed the distance and
+    the ego velocity of every tick.
+    '''
+    def __init__(self, thr=0.0):
+        self.robustness = OnlineRobustness('always', thr, signal_min=0.0)
+        self.collision = 0
+        self.velocity_sum = 0.0
+        self.last_velocity = None
+        self.comfort = 0.0
+
+    def update(self, d, ego_velocity):
+        self.robustness.update(d)
+        self.collision = max(self.collision, int(d <= 0.0))
+        self.velocity_sum += ego_velocity
+        if self.last_velocity is not None:
+            self.comfort = max(self.comfort, abs(ego_velocity - self.last_velocity))
+        self.last_velocity = ego_velocity
+
+    @property
+    def decided(self):
+        return self.robustness.decided
+
+    def settle_distance(self, d, closing_speed, max_accel, time_left):
+        # The distance can shrink at most by closing_speed*t + max_accel*t^2/2
+        # over the time left; if that cannot undercut the running minimum the
+        # robustness is final
+        bound = d - closing_speed*time_left - 0.5*max_accel*time_left**2
+        return self.robustness.settle(bound)
+
+    def reason(self):
+        # why the objectives are decided (None if they are not)
+        if not self.decided:
+            return None
+        if self.collision:
+            return 'collision'
+        if self.robustness.settled:
+            return 'distance cannot drop below its minimum before the timeout'
+        return 'robustness at its bound'
+
+    def getRobustness(self):
+        rob = self.robustness.value
+        print('ROBUSTNESS = %.3f' % rob)
+        return rob
+
+    def getObjectives(self):
+        rob = self.robustness.value
+        progress = self.velocity_sum/max(self.robustness.samples, 1)
+        print('ROBUSTNESS = %.3f, COLLISION = %i, PROGRESS = %.3f, COMFORT = %.3f'
+              % (rob, self.collision, progress, self.comfort))
+        return rob, self.collision, progress, self.comfort
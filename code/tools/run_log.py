@@ -0,0 +1,192 @@
+import os
+import csv
+import numpy as np
+
+#==============================================================================
+# Append-only binary history of an annealing run plus sampler checkpoints.
+#
+# history.bin: 24 byte header (magic, num_simult_runs, xdim) followed by one
+# fixed-size record per step, so the file can be memory-mapped as a
+# structured array. A partially written trailing record (crash) is ignored.
+# Accept flags are stored packed, one bit per chain. Logs of the first
+# format (RSSLOG01: one byte per accept flag, no surrogate errors) are read
+# through a conversion and upgraded in place when a run resumes from them.
+# checkpoint.npz: full sampler state, replaced atomically.
+#==============================================================================
+LOG_NAME = 'history.bin'
+CHECKPOINT_NAME = 'checkpoint.npz'
+MAGIC = b'RSSLOG02'
+MAGIC_V1 = b'RSSLOG01'
+HEADER_SIZE = 24
+
+
+def record_dtype(num_simult_runs, xdim):
+    n = num_simult_runs
+    return np.dtype([
+        ('step', '<i8'),
+        ('x', '<f8', (n, xdim)),
+        ('f', '<f8', (n,)),
+        ('accept_x', '<f8', (n, xdim)),
+        ('accept', 'u1', ((n+7)//8,)),
+        ('best_x', '<f8', (n, xdim)),
+        ('best_f', '<f8', (n,)),
+        ('surrogate_error', '<f8', (n,)),
+    ])
+
+
+def record_dtype_v1(num_simult_runs, xdim):
+    n = num_simult_runs
+    return np.dtype([
+        ('step', '<i8'),
+        ('x', '<f8', (n, xdim)),
+        ('f', '<f8', (n,)),
+        ('accept_x', '<f8', (n, xdim)),
+        ('accept', '?', (n,)),
+        ('best_x', '<f8', (n, xdim)),
+        ('best_f', '<f8', (n,)),
+    ])
+
+
+def _records(filename, dtype):
+    nrec = (os.path.getsize(filename) - HEADER_SIZE) // dtype.itemsize
+    if nrec <= 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(filename, dtype=dtype, mode='r', offset=HEADER_SIZE, shape=(nrec,))
+
+
+def _convert_v1(old, num_simult_runs, xdim):
+    new = np.zeros(old.shape[0], dtype=record_dtype(num_simult_runs, xdim))
+    for name in ('step', 'x', 'f', 'accept_x', 'best_x', 'best_f'):
+        new[name] = old[name]
+    new['accept'] = np.packbits(np.asarray(old['accept'], dtype=bool), axis=-1)
+    new['surrogate_error'] = np.nan
+    return new
+
+
+def upgrade_log(filename):
+    # Rewrite an RSSLOG01 log in the current format (atomically); no-op for
+    # current logs
+    magic, n, xdim = read_header(filename, version=True)
+    if magic == MAGIC:
+        return
+    records = _convert_v1(_records(filename, record_dtype_v1(n, xdim)), n, xdim)
+    tmp = filename + '.tmp'
+    with open(tmp, 'wb') as file:
+        file.write(MAGIC + np.array([n, xdim], dtype='<i8').tobytes())
+        file.write(records.tobytes())
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp, filename)
+
+
+def unpack_accept(packed, num_simult_runs):
+    # Packed accept field of one or more records -> bool array (..., n)
+    bits = np.unpackbits(np.asarray(packed, dtype=np.uint8), axis=-1)
+    return bits[..., :num_simult_runs].astype(bool)
+
+
+class RunLog(object):
+    def __init__(self, folder, num_simult_runs, xdim, resume=False):
+        self.filename = os.path.join(folder, LOG_NAME)
+        self.num_simult_runs = num_simult_runs
+        self.dtype = record_dtype(num_simult_runs, xdim)
+        header = np.array([num_simult_runs, xdim], dtype='<i8').tobytes()
+
+        if resume and os.path.exists(self.filename):
+            upgrade_log(self.filename)
+            n, d = read_header(self.filename)
+            if (n, d) != (num_simult_runs, xdim):
+                raise ValueError('Run log %s has %d chains x %d dims, expected %d x %d'
+                                 % (self.filename, n, d, num_simult_runs, xdim))
+            self.file = open(self.filename, 'r+b')
+            # drop a partially written trailing record
+            self.file.truncate(HEADER_SIZE + len(self)*self.dtype.itemsize)
+            self.file.seek(0, os.SEEK_END)
+        else:
+            self.file = open(self.filename, 'wb')
+            self.file.write(MAGIC + header)
+            self.file.flush()
+
+    def __len__(self):
+        size = os.path.getsize(self.filename) - HEADER_SIZE
+        return max(size, 0) // self.dtype.itemsize
+
+    def append(self, step, x, f, accept_x, accept, best_x, best_f, surrogate_error=None):
+        rec = np.zeros(1, dtype=self.dtype)
+        rec['step'] = step
+        rec['x'] = x
+        rec['f'] = f
+        rec['accept_x'] = accept_x
+        rec['accept'] = np.packbits(np.reshape(accept, -1).astype(bool))
+        rec['best_x'] = best_x
+        rec['best_f'] = best_f
+        rec['surrogate_error'] = np.nan if surrogate_error is None else surrogate_error
+        self.file.write(rec.tobytes())
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def read_header(filename, version=False):
+    # (num_simult_runs, xdim), with version=True (magic, num_simult_runs, xdim)
+    with open(filename, 'rb') as file:
+        header = file.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE or header[:8] not in (MAGIC, MAGIC_V1):
+        raise ValueError('%s is not an annealing run log' % filename)
+    n, xdim = np.frombuffer(header[8:], dtype='<i8')
+    if version:
+        return header[:8], int(n), int(xdim)
+    return int(n), int(xdim)
+
+
+def read_log(folder):
+    # Memory-mapped structured array of all complete records; an RSSLOG01
+    # log is converted in memory (the file is left as it is)
+    filename = os.path.join(folder, LOG_NAME)
+    magic, n, xdim = read_header(filename, version=True)
+    if magic == MAGIC_V1:
+        return _convert_v1(_records(filename, record_dtype_v1(n, xdim)), n, xdim)
+    return _records(filename, record_dtype(n, xdim))
+
+
+def export_csv(folder):
+    # Write the CSV files runFunc used to produce (one row per step)
+    log = read_log(folder)
+    names = {'best_x_history': 'best_x', 'best_f_history': 'best_f',
+             'x_history': 'x', 'f_history': 'f'}
+    for name, field in names.items():
+        with open(os.path.join(folder, name+'.csv'), 'w') as file:
+            writer = csv.writer(file, delimiter=',')
+            for rec in log[field]:
+                writer.writerow(rec.reshape(-1))
+    if len(log) and np.any(np.isfinite(log['surrogate_error'])):
+        np.savetxt(os.path.join(folder, 'surrogate_error_history.csv'), log['surrogate_error'], delimiter=',')
+
+
+def save_checkpoint(folder, step, currentSamples, objectives, solutions, sol_x, schedule=()):
+    # schedule: state of the cooling schedule (flat float array)
+    rng = np.random.get_state()
+    filename = os.path.join(folder, CHECKPOINT_NAME)
+    tmp = filename + '.tmp'
+    with open(tmp, 'wb') as file:
+        np.savez(file, step=step, currentSamples=currentSamples, objectives=objectives,
+                 solutions=solutions, sol_x=sol_x, schedule=np.asarray(schedule, dtype=float),
+                 rng_name=rng[0], rng_keys=rng[1], rng_pos=rng[2],
+                 rng_has_gauss=rng[3], rng_cached_gaussian=rng[4])
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp, filename)
+
+
+def load_checkpoint(folder):
+    # Returns None if the run never got to its first checkpoint
+    filename = os.path.join(folder, CHECKPOINT_NAME)
+    if not os.path.exists(filename):
+        return None
+    with np.load(filename) as data:
+        state = {key: data[key] for key in data.files}
+    state['step'] = int(state['step'])
+    state['rng'] = (str(state.pop('rng_name')), state.pop('rng_keys'), int(state.pop('rng_pos')),
+                    int(state.pop('rng_has_gauss')), float(state.pop('rng_cached_gaussian')))
+    return state
@@ -0,0 +1,99 @@
+import numpy as np
+from numpy import linalg as LA
+
+#==============================================================================
+# Hit-and-run proposals and Metropolis acceptance, batched over chains.
+# Shared by runFunc (tools.annealing) and the ask/tell optimizers.
+#==============================================================================
+def get_next_samples(currentSamples, initSpace, constraints=None):
+    # Batched hit-and-run step: currentSamples is (num_chains, xdim) and
+    # every chain gets its own direction and chord in one pass.
+    # constraints: optional (A, b) with A x <= b in parameter units (see
+    # rss_params.defineRssConstraints); the chord is then cut by the whole
+    # polytope, so proposals from feasible samples are always feasible.
+
+    # Trick 1: Normalize the samples (rescale to map to [0,1])
+    # (This is all about sampler efficiency)
+    # Goal is to be able to sample from multivariate standard normal...
+    # and then convert back to this space.
+    lower = initSpace[:,0]
+    intervalWidths = initSpace[:,1] - initSpace[:,0]
+    scaledSamples = (np.atleast_2d(currentSamples) - lower)/intervalWidths
+    nchains = scaledSamples.shape[0]
+
+    # Trick 2: Sample from multivariate normal and get unit directions
+    directions = np.random.normal(size=scaledSamples.shape)
+    directions /= LA.norm(directions, axis=1)[:, np.newaxis]
+
+    # Trick 3: Distance along +/- direction until the chord leaves the unit box
+    pos = directions > 0
+    neg = directions < 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        to_upper = (1 - scaledSamples)/np.abs(directions)
+        to_lower = scaledSamples/np.abs(directions)
+    z_plus_step = np.min(np.where(pos, to_upper, np.where(neg, to_lower, np.inf)), axis=1)
+    z_minus_step = np.min(np.where(neg, to_upper, np.where(pos, to_lower, np.inf)), axis=1)
+
+    if constraints is not None:
+        # same in the scaled space: A (s*w + lower) <= b
+        A, b = constraints
+        A = np.atleast_2d(A)
+        scaledA = A*intervalWidths
+        slack = (b - A.dot(lower)) - scaledSamples.dot(scaledA.T)
+        rate = directions.dot(scaledA.T)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            to_face = np.maximum(slack, 0.0)/np.abs(rate)
+        z_plus_step = np.minimum(z_plus_step, np.min(np.where(rate > 0, to_face, np.inf), axis=1))
+        z_minus_step = np.minimum(z_minus_step, np.min(np.where(rate < 0, to_face, np.inf), axis=1))
+
+    # Trick 4: Pick a side proportionally to its length and a step along it
+    z = np.random.uniform(0, 1.2, size=nchains)
+    z[z>1] = 0.99
+    # (a chord of zero length, e.g. at a vertex of the polytope, stays put)
+    chord = np.maximum(z_plus_step+z_minus_step, 1e-300)
+    go_minus = np.random.uniform(size=nchains) < z_minus_step/chord
+    z = np.where(go_minus, -z*z_minus_step, z*z_plus_step)
+
+    # Trick 5: Convert back to actual sample space, basically undo 'Trick 1'
+    nextSamples = (scaledSamples + z[:, np.newaxis]*directions)*intervalWidths + lower
+    return nextSamples
+
+
+def get_next_sample(currentSample, initSpace, constraints=None):
+    return get_next_samples(currentSample[np.newaxis, :], initSpace, constraints)[0]
+
+
+def is_feasible(samples, initSpace, constraints=None, tol=1e-9):
+    # Per sample: inside the box and satisfying A x <= b
+    samples = np.atleast_2d(samples)
+    ok = np.all((samples >= initSpace[:,0] - tol) & (samples <= initSpace[:,1] + tol), axis=1)
+    if constraints is not None:
+        A, b = constraints
+        ok &= np.all(samples.dot(np.atleast_2d(A).T) <= np.asarray(b) + tol, axis=1)
+    return ok
+
+
+def check_feasible(samples, initSpace, constraints=None):
+    ok = is_feasible(samples, initSpace, constraints)
+    if not np.all(ok):
+        raise ValueError('Initial samples %s violate the bounds or constraints' % np.nonzero(~ok)[0])
+
+
+def accept_values(proposals, objectives, temperature):
+    # We always accept moves which improve the objective
+    # and sometimes, moves which don't:
+    # as the temperature increases it becomes less likely that
+    # we will accept a proposal which is less than the objective.
+    # Early on, it is easier to 'figuratively climb hills',
+    # although there is no gradient here.
+    # As the process moves forward the mass of the distribution
+    # becomes concentrated around the current best objective value
+    proposals = np.asarray(proposals, dtype=float)
+    objectives = np.asarray(objectives, dtype=float)
+    threshold = np.exp(np.minimum((objectives - proposals)*temperature, 0.0))
+    u = np.random.uniform(0.0, 1.0, size=proposals.shape)
+    return (proposals < objectives) | (u <= threshold)
+
+
+def accept_value(proposal, objective, temperature):
+    return bool(accept_values(proposal, objective, temperature))
@@ -0,0 +1,126 @@
+import numpy as np
+
+#==============================================================================
+# Cooling schedules for runFunc.
+#
+# As in accept_value, the 'temperature' is the factor the objective
+# difference is multiplied with: the larger it is, the less likely an uphill
+# move is accepted. temperature(i) may return a scalar or one value per chain.
+# update() is called after every step with that step's accept flags, then
+# exchange() may swap states between chains in place.
+#==============================================================================
+class LinearSchedule(object):
+    # The original runFunc schedule: temperature = i/tsched
+    def __init__(self, tsched=100.):
+        self.tsched = tsched
+
+    def temperature(self, i):
+        return i*(1./self.tsched)
+
+    def update(self, accepts):
+        pass
+
+    def exchange(self, i, currentSamples, objectives):
+        pass
+
+    def get_state(self):
+        return np.zeros(0)
+
+    def set_state(self, state):
+        pass
+
+
+class ExponentialSchedule(LinearSchedule):
+    # temperature = t0 * growth**i
+    def __init__(self, t0=0.01, growth=1.05):
+        self.t0 = t0
+        self.growth = growth
+
+    def temperature(self, i):
+        return self.t0*self.growth**i
+
+
+class AdaptiveSchedule(LinearSchedule):
+    '''
+    Steers every chain towards a target acceptance rate: the temperature is
+    raised when a chain accepts more often than target_accept over the last
+    window steps and lowered when it accepts less often.
+    '''
+    def __init__(self, num_simult_runs, t0=0.01, target_accept=0.25, rate=1.1, window=10,
+                 t_min=1e-4, t_max=1e4):
+        self.target_accept = target_accept
+        self.rate = rate
+        self.window = window
+        self.t_min = t_min
+        self.t_max = t_max
+        self.t = np.full(num_simult_runs, float(t0))
+        self.recent = np.zeros((0, num_simult_runs), dtype=bool)
+
+    def temperature(self, i):
+        return np.copy(self.t)
+
+    def update(self, accepts):
+        self.recent = np.vstack((self.recent, np.reshape(accepts, (1, -1))))[-self.window:]
+        accept_rate = np.mean(self.recent, axis=0)
+        factor = np.where(accept_rate > self.target_accept, self.rate, 1./self.rate)
+        self.t = np.clip(self.t*factor, self.t_min, self.t_max)
+
+    def get_state(self):
+        # temperatures followed by the acceptance window, row by row
+        return np.concatenate((self.t, self.recent.reshape(-1).astype(float)))
+
+    def set_state(self, state):
+        n = self.t.shape[0]
+        self.t = np.array(state[:n], dtype=float)
+        self.recent = np.asarray(state[n:]).reshape(-1, n).astype(bool)
+
+
+class ReplicaExchange(LinearSchedule):
+    '''
+    Parallel tempering: chain j always runs at temperature ladder[j]
+    (geometric from t_min to t_max) and every swap_every steps neighbouring
+    chains exchange their states with the Metropolis swap probability
+    min(1, exp((t_a - t_b)*(f_a - f_b))).
+    Costs no extra simulations; hot chains explore, cold chains refine.
+    '''
+    def __init__(self, num_simult_runs, t_min=0.01, t_max=10.0, swap_every=1):
+        self.ladder = np.geomspace(t_min, t_max, num_simult_runs)
+        self.swap_every = swap_every
+        self.swap_attempts = np.zeros(max(num_simult_runs-1, 0), dtype=int)
+        self.swap_accepts = np.zeros(max(num_simult_runs-1, 0), dtype=int)
+
+    def temperature(self, i):
+        return np.copy(self.ladder)
+
+    def exchange(self, i, currentSamples, objectives):
+        if (i+1) % self.swap_every != 0:
+            return
+        # alternate even and odd neighbour pairs so every pair is disjoint
+        offset = (i // self.swap_every) % 2
+        a = np.arange(offset, self.ladder.shape[0]-1, 2)
+        b = a + 1
+        with np.errstate(invalid='ignore', over='ignore'):
+            delta = (self.ladder[a] - self.ladder[b])*(objectives[a] - objectives[b])
+            swap = np.log(np.random.uniform(size=a.shape)) < delta
+        self.swap_attempts[a] += 1
+        self.swap_accepts[a[swap]] += 1
+        a, b = a[swap], b[swap]
+        currentSamples[a], currentSamples[b] = np.copy(currentSamples[b]), np.copy(currentSamples[a])
+        objectives[a], objectives[b] = np.copy(objectives[b]), np.copy(objectives[a])
+
+    def swap_rates(self):
+        return self.swap_accepts/np.maximum(self.swap_attempts, 1).astype(float)
+
+    def get_state(self):
+        return np.concatenate((self.swap_attempts, self.swap_accepts)).astype(float)
+
+    def set_state(self, state):
+        n = self.swap_attempts.shape[0]
+        self.swap_attempts = np.array(state[:n], dtype=int)
+        self.swap_accepts = np.array(state[n:], dtype=int)
+
+
+def get_schedule(schedule=None):
+    if schedule is None:
+        return LinearSchedule()
+    return schedule
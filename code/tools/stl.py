@@ -0,0 +1,493 @@
+from collections import deque
+import numpy as np
+
+#==============================================================================
+# Bounded-time Signal Temporal Logic over named trajectory columns.
+#
+# Formulas are small ASTs; time bounds are in seconds and converted to
+# samples with the time step dt of the trajectory:
+#
+#   cut_in = Pred('lateral_gap', '<=', 1.0)
+#   spec = Always(Implies(cut_in, Eventually(Pred('distance', '>=', 'd_rss'), 0, 2.0)))
+#   rob = spec.robustness(signals, dt=0.015)          # offline, signals: {name: array}
+#
+#   monitor = OnlineMonitor(spec, dt=0.015)           # online, one sample per tick
+#   monitor.update({'distance': d, 'd_rss': d_rss, 'lateral_gap': g})
+#   rob = monitor.finish()
+#
+# Quantitative semantics on finite traces: windows are cut at the end of
+# the trace, an empty window gives +Inf for always and -Inf for eventually.
+# Offline, bounded always/eventually use the van Herk/Gil-Werman block
+# min/max (a few vectorized passes); online they use monotonic deques.
+# Until is reduced to those and one backward pass offline and runs on a
+# two-stack window of clamp functions online (UntilWindow), so every
+# operator is linear in the trace length.
+#==============================================================================
+INF = float('Inf')
+
+
+def _samples(t, dt):
+    return None if t is None else int(np.round(t/dt))
+
+
+def _check_bounds(a, b):
+    # time bounds [a, b] of a temporal operator, b=None: until the end
+    if a < 0 or (b is not None and b < a):
+        raise ValueError('Invalid time bounds [%s, %s]' % (a, b))
+
+
+#==============================================================================
+# Sliding windows
+#==============================================================================
+def sliding_min(x, a, b):
+    # z[t] = min(x[t+a .. t+b]) with the window cut at the end of x
+    x = np.asarray(x, dtype=float)
+    T = x.size
+    z = np.full(T, INF)
+    if T == 0 or a >= T:
+        return z
+    w = b - a + 1
+    nblocks = -(-(T + w) // w)
+    padded = np.full(nblocks*w, INF)
+    padded[:T] = x
+    blocks = padded.reshape(nblocks, w)
+    prefix = np.minimum.accumulate(blocks, axis=1).reshape(-1)
+    suffix = np.minimum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].reshape(-1)
+    start = np.arange(a, T)
+    z[:T-a] = np.minimum(suffix[start], prefix[start + w - 1])
+    return z
+
+
+def sliding_max(x, a, b):
+    return -sliding_min(-np.asarray(x, dtype=float), a, b)
+
+
+def suffix_min(x, a=0):
+    # z[t] = min(x[t+a ..])
+    x = np.asarray(x, dtype=float)
+    z = np.full(x.size, INF)
+    if a < x.size:
+        z[:x.size-a] = np.minimum.accumulate(x[::-1])[::-1][a:]
+    return z
+
+
+class MonotonicWindow(object):
+    '''
+    Online min (or max) over a sliding window of a stream: push values in
+    order, query the extremum over indices >= lo. Each value enters and
+    leaves the deque once, so updates are O(1) amortized.
+    '''
+    def __init__(self, maximum=False):
+        self.sign = -1.0 if maximum else 1.0
+        self.items = deque()
+        self.count = 0
+
+    def push(self, value):
+        v = self.sign*value
+        while self.items and self.items[-1][1] >= v:
+            self.items.pop()
+        self.items.append((self.count, v))
+        self.count += 1
+
+    def query(self, lo):
+        while self.items and self.items[0][0] < lo:
+            self.items.popleft()
+        if not self.items:
+            return self.sign*INF
+        return self.sign*self.items[0][1]
+
+
+def _clamp(f, v):
+    return min(f[1], max(f[0], v))
+
+
+def _compose(f, g):
+    # clamps v -> min(hi, max(lo, v)) as (lo, hi); f o g is again a clamp
+    return (_clamp(f, g[0]), _clamp(f, g[1]))
+
+
+class UntilWindow(object):
+    '''
+    Online until over a sliding window of a stream of (x, y) pairs: value()
+    is max over j >= lo of min(x[lo..j], y[j]), lo set by evict(lo). This
+    is (f_lo o ... o f_last)(-Inf) with f_j(v) = min(x_j, max(y_j, v)), a
+    clamp; clamps compose associatively, so the composition is kept in a
+    two-stack queue and push/evict are O(1) amortized.
+    '''
+    IDENTITY = (-INF, INF)
+
+    def __init__(self):
+        self.front = []     # (index, f_index o ... o f_newest of front), oldest last
+        self.back = []      # (index, f_index), oldest first
+        self.back_agg = self.IDENTITY
+        self.count = 0
+
+    def push(self, x, y):
+        f = (min(x, y), x)
+        self.back.append((self.count, f))
+        self.back_agg = _compose(self.back_agg, f)
+        self.count += 1
+
+    def evict(self, lo):
+        while True:
+            while self.front and self.front[-1][0] < lo:
+                self.front.pop()
+            if self.front or not self.back or self.back[0][0] >= lo:
+                return
+            agg = self.IDENTITY
+            for i, f in reversed(self.back):
+                agg = _compose(f, agg)
+                self.front.append((i, agg))
+            self.back = []
+            self.back_agg = self.IDENTITY
+
+    def value(self):
+        front = self.front[-1][1] if self.front else self.IDENTITY
+        return _clamp(front, self.back_agg[0])
+
+
+#==============================================================================
+# Formulas
+#==============================================================================
+class Formula(object):
+    def signal(self, signals, dt):
+        # robustness at every sample of the trace
+        raise NotImplementedError
+
+    def online(self, dt):
+        raise NotImplementedError
+
+    def robustness(self, signals, dt):
+        # robustness at time 0
+        return float(self.signal(signals, dt)[0])
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+
+class Pred(Formula):
+    # column >= / <= threshold, threshold a number or another column
+    def __init__(self, column, op, threshold):
+        if op not in ('>=', '<='):
+            raise ValueError('Unknown comparison: %s' % op)
+        self.column = column
+        self.op = op
+        self.threshold = threshold
+
+    def _value(self, signals):
+        x = np.asarray(signals[self.column], dtype=float)
+        c = signals[self.threshold] if isinstance(self.threshold, str) else self.threshold
+        return x - c if self.op == '>=' else c - x
+
+    def signal(self, signals, dt):
+        return self._value(signals)*np.ones(len(signals[self.column]))
+
+    def online(self, dt):
+        return _OnlinePred(self)
+
+    def __repr__(self):
+        return '(%s %s %s)' % (self.column, self.op, self.threshold)
+
+
+class Not(Formula):
+    def __init__(self, phi):
+        self.phi = phi
+
+    def signal(self, signals, dt):
+        return -self.phi.signal(signals, dt)
+
+    def online(self, dt):
+        return _OnlineNot(self.phi.online(dt))
+
+    def __repr__(self):
+        return '~%r' % (self.phi,)
+
+
+class And(Formula):
+    def __init__(self, phi, psi):
+        self.phi = phi
+        self.psi = psi
+
+    def signal(self, signals, dt):
+        return np.minimum(self.phi.signal(signals, dt), self.psi.signal(signals, dt))
+
+    def online(self, dt):
+        return _OnlineBinary(self.phi.online(dt), self.psi.online(dt), min)
+
+    def __repr__(self):
+        return '(%r & %r)' % (self.phi, self.psi)
+
+
+class Or(Formula):
+    def __init__(self, phi, psi):
+        self.phi = phi
+        self.psi = psi
+
+    def signal(self, signals, dt):
+        return np.maximum(self.phi.signal(signals, dt), self.psi.signal(signals, dt))
+
+    def online(self, dt):
+        return _OnlineBinary(self.phi.online(dt), self.psi.online(dt), max)
+
+    def __repr__(self):
+        return '(%r | %r)' % (self.phi, self.psi)
+
+
+def Implies(phi, psi):
+    return Or(Not(phi), psi)
+
+
+class Always(Formula):
+    # phi holds at every time in [t+a, t+b] (b=None: until the end)
+    maximum = False
+
+    def __init__(self, phi, a=0.0, b=None):
+        _check_bounds(a, b)
+        self.phi = phi
+        self.a = a
+        self.b = b
+
+    def signal(self, signals, dt):
+        x = self.phi.signal(signals, dt)
+        sign = -1.0 if self.maximum else 1.0
+        a, b = _samples(self.a, dt), _samples(self.b, dt)
+        if b is None:
+            return sign*suffix_min(sign*x, a)
+        return sign*sliding_min(sign*x, a, b)
+
+    def online(self, dt):
+        return _OnlineWindow(self, self.phi.online(dt), dt)
+
+    def __repr__(self):
+        return '%s[%s,%s]%r' % (type(self).__name__, self.a, self.b, self.phi)
+
+
+class Eventually(Always):
+    # phi holds at some time in [t+a, t+b]
+    maximum = True
+
+
+class Until(Formula):
+    # psi holds at some t' in [t+a, t+b] and phi holds on all of [t, t']
+    def __init__(self, phi, psi, a=0.0, b=None):
+        _check_bounds(a, b)
+        self.phi = phi
+        self.psi = psi
+        self.a = a
+        self.b = b
+
+    def signal(self, signals, dt):
+        return _until(self.phi.signal(signals, dt), self.psi.signal(signals, dt),
+                      _samples(self.a, dt), _samples(self.b, dt))
+
+    def online(self, dt):
+        return _OnlineUntil(self, self.phi.online(dt), self.psi.online(dt), dt)
+
+    def __repr__(self):
+        return '(%r U[%s,%s] %r)' % (self.phi, self.a, self.b, self.psi)
+
+
+def _until(x, y, a, b):
+    # min(always[0,a] x, eventually[a,b] y, unbounded until from t+a) is the
+    # bounded until: a witness of the unbounded until later than t+b can be
+    # replaced by the witness of the eventually, x holding up to both
+    T = x.size
+    # U(t) = min(x(t), max(y(t), U(t+1))) backwards
+    U = np.empty(T)
+    acc = -INF
+    for t in range(T-1, -1, -1):
+        acc = min(x[t], max(y[t], acc))
+        U[t] = acc
+    z = np.full(T, -INF)
+    if a < T:
+        z[:T-a] = np.minimum(sliding_min(x, 0, a)[:T-a], U[a:])
+    if b is not None:
+        z = np.minimum(z, sliding_max(y, a, b))
+    return z
+
+
+#==============================================================================
+# Online evaluation. Every node turns its input stream into its robustness
+# stream: push(sample) returns the robustness values that became final
+# (in time order), finish() the remaining ones at the end of the trace.
+#==============================================================================
+class _OnlinePred(object):
+    def __init__(self, pred):
+        self.pred = pred
+
+    def push(self, sample):
+        return [float(self.pred._value(sample))]
+
+    def finish(self):
+        return []
+
+
+class _OnlineNot(object):
+    def __init__(self, child):
+        self.child = child
+
+    def push(self, sample):
+        return [-v for v in self.child.push(sample)]
+
+    def finish(self):
+        return [-v for v in self.child.finish()]
+
+
+class _OnlineBinary(object):
+    def __init__(self, left, right, combine):
+        self.left = left
+        self.right = right
+        self.combine = combine
+        self.left_buffer = deque()
+        self.right_buffer = deque()
+
+    def _emit(self):
+        out = []
+        while self.left_buffer and self.right_buffer:
+            out.append(self.combine(self.left_buffer.popleft(), self.right_buffer.popleft()))
+        return out
+
+    def push(self, sample):
+        self.left_buffer.extend(self.left.push(sample))
+        self.right_buffer.extend(self.right.push(sample))
+        return self._emit()
+
+    def finish(self):
+        self.left_buffer.extend(self.left.finish())
+        self.right_buffer.extend(self.right.finish())
+        return self._emit()
+
+
+class _OnlineWindow(object):
+    # bounded always/eventually: output t is final once input t+b arrived
+    def __init__(self, formula, child, dt):
+        self.formula = formula
+        self.child = child
+        self.a = _samples(formula.a, dt)
+        self.b = _samples(formula.b, dt)
+        self.window = MonotonicWindow(maximum=formula.maximum)
+        self.history = []
+        self.next_t = 0
+
+    def _consume(self, values):
+        if self.b is None:
+            self.history += values
+            return []
+        out = []
+        for v in values:
+            self.window.push(v)
+            while self.next_t + self.b < self.window.count:
+                out.append(self.window.query(self.next_t + self.a))
+                self.next_t += 1
+        return out
+
+    def push(self, sample):
+        return self._consume(self.child.push(sample))
+
+    def finish(self):
+        out = self._consume(self.child.finish())
+        if self.b is None:
+            x = np.array(self.history)
+            sign = -1.0 if self.formula.maximum else 1.0
+            return out + list(sign*suffix_min(sign*x, self.a))
+        while self.next_t < self.window.count:
+            if self.next_t + self.a < self.window.count:
+                out.append(self.window.query(self.next_t + self.a))
+            else:
+                out.append(-INF if self.formula.maximum else INF)
+            self.next_t += 1
+        return out
+
+
+class _OnlineUntil(object):
+    # bounded until: min(always[0,a] phi, UntilWindow over [t+a, t+b]),
+    # output t is final once input t+b arrived
+    def __init__(self, formula, left, right, dt):
+        self.left = left
+        self.right = right
+        self.a = _samples(formula.a, dt)
+        self.b = _samples(formula.b, dt)
+        self.x = deque()
+        self.y = deque()
+        self.lagged = deque()       # phi values not yet in self.always
+        self.always = MonotonicWindow()
+        self.until = UntilWindow()
+        self.history_x = []
+        self.history_y = []
+        self.next_t = 0
+
+    def _value(self, t):
+        # phi over [t, t+a] (cut at the end of the trace), until from t+a
+        while self.lagged and self.always.count <= t + self.a:
+            self.always.push(self.lagged.popleft())
+        self.until.evict(t + self.a)
+        return min(self.always.query(t), self.until.value())
+
+    def _consume(self, final):
+        # one pair at a time: output t is taken as soon as input t+b is in
+        # the window, before any later input (a child may emit several)
+        out = []
+        while self.x and self.y:
+            x, y = self.x.popleft(), self.y.popleft()
+            self.until.push(x, y)
+            self.lagged.append(x)
+            while self.next_t + self.b < self.until.count:
+                out.append(self._value(self.next_t))
+                self.next_t += 1
+        if final:
+            count = self.until.count
+            while self.next_t < count:
+                out.append(self._value(self.next_t) if self.next_t + self.a < count else -INF)
+                self.next_t += 1
+        return out
+
+    def push(self, sample):
+        x, y = self.left.push(sample), self.right.push(sample)
+        if self.b is None:
+            self.history_x += x
+            self.history_y += y
+            return []
+        self.x.extend(x)
+        self.y.extend(y)
+        return self._consume(False)
+
+    def finish(self):
+        x, y = self.left.finish(), self.right.finish()
+        if self.b is None:
+            return list(_until(np.array(self.history_x + x), np.array(self.history_y + y), self.a, None))
+        self.x.extend(x)
+        self.y.extend(y)
+        return self._consume(True)
+
+
+class OnlineMonitor(object):
+    '''
+    Incremental evaluation of a formula, one sample (dict of column values)
+    per tick. outputs holds the robustness values that are already final
+    (outputs[t] for time t*dt); value is the robustness at time 0 once it
+    is final, else None.
+    '''
+    def __init__(self, formula, dt):
+        self.formula = formula
+        self.root = formula.online(dt)
+        self.outputs = []
+        self.samples = 0
+
+    def update(self, sample):
+        self.samples += 1
+        self.outputs += self.root.push(sample)
+        return self.value
+
+    @property
+    def value(self):
+        return self.outputs[0] if self.outputs else None
+
+    def finish(self):
+        self.outputs += self.root.finish()
+        return self.value
@@ -0,0 +1,119 @@
+'''
+Regression check of the STL engine (tools.stl), no CARLA needed.
+
+Random nested formulas over random traces are evaluated three ways: by the
+definitions directly (quadratic, per sample), offline (Formula.signal) and
+online (OnlineMonitor, one sample per tick). Any difference is printed and
+the exit status is the number of failing formulas.
+
+    cd code
+    python -m tools.stl_check --trials 1500 --seed 0
+'''
+import sys
+import argparse
+import numpy as np
+
+from tools import stl
+
+INF = stl.INF
+
+
+#==============================================================================
+# Reference semantics straight from the definitions
+#==============================================================================
+def _window(t, a, b, T):
+    # sample indices t+a .. t+b, cut at the end of the trace
+    end = T - 1 if b is None else min(t + b, T - 1)
+    return range(t + a, end + 1)
+
+
+def brute_signal(formula, signals, dt):
+    T = len(next(iter(signals.values())))
+    if isinstance(formula, stl.Pred):
+        return np.array([float(formula._value(dict((k, v[t]) for k, v in signals.items())))
+                         for t in range(T)])
+    if isinstance(formula, stl.Not):
+        return -brute_signal(formula.phi, signals, dt)
+    if isinstance(formula, (stl.And, stl.Or)):
+        combine = min if isinstance(formula, stl.And) else max
+        x, y = brute_signal(formula.phi, signals, dt), brute_signal(formula.psi, signals, dt)
+        return np.array([combine(x[t], y[t]) for t in range(T)])
+    a, b = stl._samples(formula.a, dt), stl._samples(formula.b, dt)
+    if isinstance(formula, stl.Always):
+        x = brute_signal(formula.phi, signals, dt)
+        if formula.maximum:
+            return np.array([max([x[k] for k in _window(t, a, b, T)] or [-INF]) for t in range(T)])
+        return np.array([min([x[k] for k in _window(t, a, b, T)] or [INF]) for t in range(T)])
+    if isinstance(formula, stl.Until):
+        x, y = brute_signal(formula.phi, signals, dt), brute_signal(formula.psi, signals, dt)
+        return np.array([max([min(min(x[t:k+1]), y[k]) for k in _window(t, a, b, T)] or [-INF])
+                         for t in range(T)])
+    raise TypeError('Unknown formula: %r' % (formula,))
+
+
+#==============================================================================
+# Random formulas and traces
+#==============================================================================
+COLUMNS = ['x', 'y', 'z']
+
+
+def random_bounds(rng, dt):
+    a = rng.randint(0, 4)
+    b = None if rng.uniform() < 0.2 else a + rng.randint(0, 5)
+    return a*dt, (None if b is None else b*dt)
+
+
+def random_formula(rng, dt, depth=3):
+    if depth == 0 or rng.uniform() < 0.25:
+        return stl.Pred(COLUMNS[rng.randint(len(COLUMNS))], ['>=', '<='][rng.randint(2)],
+                        float(np.round(rng.normal(), 1)))
+    kind = rng.randint(6)
+    if kind == 0:
+        return stl.Not(random_formula(rng, dt, depth-1))
+    if kind in (1, 2):
+        operator = stl.And if kind == 1 else stl.Or
+        return operator(random_formula(rng, dt, depth-1), random_formula(rng, dt, depth-1))
+    if kind in (3, 4):
+        operator = stl.Always if kind == 3 else stl.Eventually
+        return operator(random_formula(rng, dt, depth-1), *random_bounds(rng, dt))
+    return stl.Until(random_formula(rng, dt, depth-1), random_formula(rng, dt, depth-1),
+                     *random_bounds(rng, dt))
+
+
+def online_signal(formula, signals, dt):
+    T = len(next(iter(signals.values())))
+    monitor = stl.OnlineMonitor(formula, dt)
+    for t in range(T):
+        monitor.update(dict((k, v[t]) for k, v in signals.items()))
+    monitor.finish()
+    return np.array(monitor.outputs)
+
+
+def check(trials, seed=0, dt=0.1, max_length=25):
+    # Returns the formulas (with their traces) where the three evaluations differ
+    rng = np.random.RandomState(seed)
+    failures = []
+    for _ in range(trials):
+        formula = random_formula(rng, dt)
+        T = rng.randint(1, max_length + 1)
+        signals = dict((name, np.round(rng.normal(size=T), 1)) for name in COLUMNS)
+        reference = brute_signal(formula, signals, dt)
+        offline = formula.signal(signals, dt)
+        online = online_signal(formula, signals, dt)
+        if not (np.array_equal(reference, offline) and online.shape == reference.shape
+                and np.array_equal(reference, online)):
+            failures.append((formula, signals, reference, offline, online))
+    return failures
+
+
+if __name__ == '__main__':
+    PARSER = argparse.ArgumentParser(description='Compare offline, online and reference STL robustness')
+    PARSER.add_argument('--trials', type=int, default=1500, help='Random formulas')
+    PARSER.add_argument('--seed', type=int, default=0)
+    ARGUMENTS = PARSER.parse_args()
+
+    FAILURES = check(ARGUMENTS.trials, ARGUMENTS.seed)
+    for formula, signals, reference, offline, online in FAILURES:
+        print('%r\n  reference %s\n  offline   %s\n  online    %s' % (formula, reference, offline, online))
+    print('%i of %i formulas differ' % (len(FAILURES), ARGUMENTS.trials))
+    sys.exit(min(len(FAILURES), 255))
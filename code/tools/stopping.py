@@ -0,0 +1,84 @@
+import time
+import numpy as np
+
+#==============================================================================
+# Stopping criteria for runFunc.
+#
+# check(step, best_f_history) is called after every step with the rows
+# filled so far and returns a reason string to stop, or None to continue.
+#==============================================================================
+class StopCriterion(object):
+    def start(self):
+        pass
+
+    def consume(self, n):
+        # n simulations were just run
+        pass
+
+    def check(self, step, best_f_history):
+        return None
+
+
+class NoImprovement(StopCriterion):
+    # Best objective over all chains did not improve by more than tol in k steps
+    def __init__(self, k, tol=0.0):
+        self.k = k
+        self.tol = tol
+
+    def check(self, step, best_f_history):
+        if step < self.k:
+            return None
+        if np.min(best_f_history[step]) >= np.min(best_f_history[step-self.k]) - self.tol:
+            return 'no improvement in %i steps' % self.k
+        return None
+
+
+class Falsified(StopCriterion):
+    # Robustness below threshold: the specification is already violated
+    def __init__(self, threshold=0.0):
+        self.threshold = threshold
+
+    def check(self, step, best_f_history):
+        if np.min(best_f_history[step]) < self.threshold:
+            return 'falsified (robustness %.3f < %.3f)' % (np.min(best_f_history[step]), self.threshold)
+        return None
+
+
+class Budget(StopCriterion):
+    '''
+    Wall-clock and/or simulation budget. The same instance can be passed to
+    several consecutive runFunc calls (e.g. one per scenario): whatever one
+    campaign leaves unused when it stops early is available to the next.
+    '''
+    def __init__(self, max_seconds=None, max_evaluations=None):
+        self.max_seconds = max_seconds
+        self.max_evaluations = max_evaluations
+        self.evaluations = 0
+        self.start_time = None
+        self.batch = 1
+
+    def start(self):
+        if self.start_time is None:
+            self.start_time = time.time()
+
+    def consume(self, n):
+        self.evaluations += n
+        self.batch = n
+
+    def remaining_evaluations(self):
+        if self.max_evaluations is None:
+            return np.inf
+        return self.max_evaluations - self.evaluations
+
+    def remaining_seconds(self):
+        if self.max_seconds is None:
+            return np.inf
+        return self.max_seconds - (time.time() - self.start_time)
+
+    def check(self, step, best_f_history):
+        # stop if the next step would not fit in the budget
+        if self.remaining_evaluations() < self.batch:
+            return 'simulation budget used (%i evaluations)' % self.evaluations
+        if self.remaining_seconds() <= 0:
+            return 'wall-clock budget used (%.0f s)' % self.max_seconds
+        return None
@@ -0,0 +1,115 @@
+from collections import deque
+import numpy as np
+from numpy import linalg as LA
+
+#==============================================================================
+# Surrogate pre-screening of annealing proposals.
+#
+# A Gaussian-process regressor (squared exponential kernel, numpy only) is
+# refit on the evaluations so far; runFunc draws n_candidates hit-and-run
+# proposals per chain and only simulates the one with the best acquisition.
+#==============================================================================
+class GPSurrogate(object):
+    def __init__(self, space, n_candidates=8, acquisition='lcb', kappa=1.0,
+                 lengthscale=None, noise=1e-6, max_points=500, min_points=None, max_errors=1000):
+        # space: (xdim, 2) bounds, inputs are rescaled to the unit box
+        # acquisition: 'mean' (most promising), 'std' (most uncertain) or
+        #   'lcb' (mean - kappa*std)
+        # max_points: only the most recent evaluations are used for fitting
+        self.space = np.asarray(space, dtype=float)
+        self.n_candidates = n_candidates
+        self.acquisition = acquisition
+        self.kappa = kappa
+        self.lengthscale = lengthscale
+        self.noise = noise
+        self.max_points = max_points
+        xdim = self.space.shape[0]
+        self.min_points = min_points if min_points is not None else 2*xdim + 1
+
+        self.prior_x = np.empty((0, xdim))
+        self.prior_f = np.empty(0)
+        self.errors = deque(maxlen=max_errors)
+        self._fitted = False
+
+    def add_prior(self, X, f):
+        # Evaluations from earlier campaigns, always part of the training set
+        self.prior_x = np.vstack((self.prior_x, np.asarray(X, dtype=float).reshape(-1, self.prior_x.shape[1])))
+        self.prior_f = np.append(self.prior_f, np.asarray(f, dtype=float).reshape(-1))
+
+    def _scale(self, X):
+        return (X - self.space[:,0])/(self.space[:,1] - self.space[:,0])
+
+    def _kernel(self, A, B):
+        sq = np.sum(A**2, axis=1)[:, np.newaxis] + np.sum(B**2, axis=1)[np.newaxis, :] - 2*A.dot(B.T)
+        return np.exp(-0.5*np.maximum(sq, 0.0)/self._ls**2)
+
+    def fit(self, X, f):
+        X = np.asarray(X, dtype=float).reshape(-1, self.space.shape[0])
+        f = np.asarray(f, dtype=float).reshape(-1)
+        X = np.vstack((self.prior_x, X[-self.max_points:]))
+        f = np.append(self.prior_f, f[-self.max_points:])
+        ok = np.isfinite(f)
+        X, f = X[ok], f[ok]
+        if X.shape[0] < self.min_points:
+            self._fitted = False
+            return False
+
+        self._X = self._scale(X)
+        self._mean = np.mean(f)
+        self._std = np.std(f) if np.std(f) > 0 else 1.0
+        y = (f - self._mean)/self._std
+
+        if self.lengthscale is None:
+            # median pairwise distance heuristic
+            d = np.sqrt(np.maximum(np.sum((self._X[:, np.newaxis, :] - self._X[np.newaxis, :, :])**2, axis=2), 0))
+            self._ls = np.median(d[d > 0]) if np.any(d > 0) else 1.0
+        else:
+            self._ls = self.lengthscale
+
+        K = self._kernel(self._X, self._X)
+        jitter = self.noise
+        while True:
+            try:
+                self._L = LA.cholesky(K + jitter*np.eye(K.shape[0]))
+                break
+            except LA.LinAlgError:
+                jitter *= 10
+        self._alpha = LA.solve(self._L.T, LA.solve(self._L, y))
+        self._fitted = True
+        return True
+
+    @property
+    def fitted(self):
+        return self._fitted
+
+    def predict(self, X):
+        # Returns mean and standard deviation in objective units
+        Xs = self._scale(np.asarray(X, dtype=float).reshape(-1, self.space.shape[0]))
+        Ks = self._kernel(Xs, self._X)
+        mean = Ks.dot(self._alpha)
+        v = LA.solve(self._L, Ks.T)
+        var = np.maximum(1.0 - np.sum(v**2, axis=0), 0.0)
+        return mean*self._std + self._mean, np.sqrt(var)*self._std
+
+    def score(self, mean, std):
+        # Lower is better
+        if self.acquisition == 'mean':
+            return mean
+        if self.acquisition == 'std':
+            return -std
+        if self.acquisition == 'lcb':
+            return mean - self.kappa*std
+        raise ValueError('Unknown acquisition: %s' % self.acquisition)
+
+    def select(self, candidates):
+        # candidates: (num_chains, n_candidates, xdim); one per chain is kept
+        n, k, xdim = candidates.shape
+        mean, std = self.predict(candidates.reshape(-1, xdim))
+        best = np.argmin(self.score(mean, std).reshape(n, k), axis=1)
+        rows = np.arange(n)
+        return candidates[rows, best], mean.reshape(n, k)[rows, best]
+
+    def record_error(self, predicted, actual):
+        # Per-chain prediction error of the proposals actually simulated;
+        # only the last max_errors steps are kept, the run log has all of them
+        self.errors.append(np.asarray(actual, dtype=float) - predicted)
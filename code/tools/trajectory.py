@@ -0,0 +1,150 @@
+import os
+import csv
+import json
+import numpy as np
+
+#==============================================================================
+# Binary trajectory files with named, typed columns.
+#
+# Layout: 8 byte magic, header length (u8), JSON header (columns, scenario,
+# variant, RSS parameters, time step, ...) padded to 8 bytes, then one fixed
+# size record per tick. Records are appended in chunks; the row count
+# follows from the file size, so a file cut short by a crash stays readable
+# up to its last complete record. Readers memory-map the records and hand
+# out every column as a zero-copy view:
+#
+#   writer = TrajectoryWriter(filename, scenario='Rss_Ext_FI_a', rss_params=rss_params, dt=0.015)
+#   writer.append(frame=i, distance=d, collision=0, ego_velocity=v_ego, pov_velocity=v_pov)
+#   writer.close()
+#
+#   header, data = read_trajectory(filename)
+#   data['distance']                       # np.memmap column view
+#==============================================================================
+MAGIC = b'RSSTRJ01'
+EXTENSION = '.traj'
+
+# Columns written by RssTest
+RSS_COLUMNS = [
+    ('frame', '<i8'),
+    ('distance', '<f8'),
+    ('collision', 'u1'),
+    ('ego_velocity', '<f4'),
+    ('pov_velocity', '<f4'),
+]
+
+# Rows of the CSV trajectories RssTest wrote before (other_aux.write2csv):
+# no header, no frame and no collision column (collision is distance <= 0)
+LEGACY_CSV_COLUMNS = ['distance', 'ego_velocity', 'pov_velocity']
+
+
+def _jsonable(value):
+    # numpy scalars in rss_params and the like
+    if isinstance(value, dict):
+        return dict((k, _jsonable(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class TrajectoryWriter(object):
+    def __init__(self, filename, columns=RSS_COLUMNS, chunk=256, **header):
+        # header: free-form metadata, e.g. scenario, variant, rss_params, dt
+        self.filename = filename
+        self.dtype = np.dtype([(name, dt) for name, dt in columns])
+        header = dict(_jsonable(header), columns=[[name, dt] for name, dt in columns])
+        text = json.dumps(header).encode('utf-8')
+        text += b' '*((-len(text)) % 8)
+        self.file = open(filename, 'wb')
+        self.file.write(MAGIC + np.array([len(text)], dtype='<u8').tobytes() + text)
+        self.buffer = np.zeros(chunk, dtype=self.dtype)
+        self.count = 0
+        self.rows = 0
+
+    def append(self, *row, **values):
+        # one record, positional in column order or by column name
+        if row:
+            self.buffer[self.count] = tuple(row)
+        else:
+            record = self.buffer[self.count:self.count+1]
+            record[...] = 0
+            for name, value in values.items():
+                record[name] = value
+        self.count += 1
+        self.rows += 1
+        if self.count == self.buffer.shape[0]:
+            self.flush()
+
+    def flush(self):
+        if self.count:
+            self.file.write(self.buffer[:self.count].tobytes())
+            self.file.flush()
+            self.count = 0
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+def is_trajectory_file(filename):
+    with open(filename, 'rb') as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+def read_header(filename):
+    # (header dict, offset of the first record)
+    with open(filename, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError('%s is not a trajectory file' % filename)
+        length = int(np.frombuffer(file.read(8), dtype='<u8')[0])
+        header = json.loads(file.read(length).decode('utf-8'))
+    return header, len(MAGIC) + 8 + length
+
+
+def read_trajectory(filename):
+    # (header, records) with records a read-only structured memmap
+    header, offset = read_header(filename)
+    dtype = np.dtype([(name, dt) for name, dt in header['columns']])
+    rows = (os.path.getsize(filename) - offset) // dtype.itemsize
+    if rows == 0:
+        return header, np.zeros(0, dtype=dtype)
+    return header, np.memmap(filename, dtype=dtype, mode='r', offset=offset, shape=(rows,))
+
+
+def read_csv(filename, columns=LEGACY_CSV_COLUMNS):
+    # {name: column} of a CSV trajectory; a last row cut short by a crash
+    # is ignored
+    with open(filename) as file:
+        rows = [row for row in csv.reader(file) if row]
+    if rows and len(rows[-1]) < len(rows[0]):
+        rows = rows[:-1]
+    data = np.array(rows, dtype=float).reshape(len(rows), -1)
+    columns = dict((name, data[:, i]) for i, name in enumerate(columns) if i < data.shape[1])
+    if 'distance' in columns and 'collision' not in columns:
+        columns['collision'] = (columns['distance'] <= 0.0).astype(np.uint8)
+    return columns
+
+
+def load_columns(filename):
+    '''
+    {name: column} of a trajectory file, or of a CSV trajectory in the
+    LEGACY_CSV_COLUMNS layout. Lets the analysis read old CSV runs and new
+    files alike.
+    '''
+    if is_trajectory_file(filename):
+        _, data = read_trajectory(filename)
+        return dict((name, data[name]) for name in data.dtype.names)
+    return read_csv(filename)
+
+
+def csv_to_trajectory(csv_filename, filename=None, **header):
+    # Convert an archived CSV trajectory to the RSS_COLUMNS layout
+    filename = filename or os.path.splitext(csv_filename)[0] + EXTENSION
+    data = read_csv(csv_filename)
+    writer = TrajectoryWriter(filename, RSS_COLUMNS, **header)
+    for frame in range(len(data['distance'])):
+        writer.append(frame=frame, **dict((name, column[frame]) for name, column in data.items()))
+    writer.close()
+    return filename
@@ -0,0 +1,120 @@
+import numpy as np
+
+from tools import run_log
+from tools import sampling
+
+#==============================================================================
+# Warm start from earlier campaigns.
+#
+# PriorResults collects evaluations per (scenario, variant) from objective
+# caches and run logs; runFunc(..., prior=prior.get('Rss_Ext_FI', 'a'))
+# then seeds its chains with the best of them and hands them to the
+# surrogate and the objective cache, so the simulator budget goes to new
+# regions only:
+#
+#   prior = PriorResults()
+#   prior.add_cache(ObjectiveCache(None, names, space, 'Rss_Ext_FI', 'a', folder=OLD_FOLDER))
+#   prior.add_run_log(OLD_RES_FOLDER, 'Rss_Ext_FI', 'a')
+#==============================================================================
+def scalar(values):
+    # Ranking value of stored objectives: tuples (several objectives, see
+    # robustness.getObjectives) are ranked on their first entry
+    return np.array([v[0] if np.ndim(v) else v for v in values], dtype=float)
+
+
+class PriorResults(object):
+    def __init__(self):
+        self.X = {}
+        self.f = {}
+
+    def add(self, scenario, variant, X, f):
+        key = (scenario, variant)
+        X = np.asarray(X, dtype=float)
+        f = list(f)
+        if key in self.X:
+            X = np.vstack((self.X[key], X))
+            f = self.f[key] + f
+        self.X[key] = X
+        self.f[key] = f
+
+    def add_cache(self, cache):
+        # everything an ObjectiveCache holds for its scenario and variant
+        X, f = cache.entries()
+        self.add(cache.scenario, cache.variant, X, f)
+
+    def add_run_log(self, folder, scenario, variant=''):
+        # every simulated proposal of a runFunc campaign (step 0 included)
+        log = run_log.read_log(folder)
+        X = log['x'].reshape(-1, log['x'].shape[-1])
+        f = log['f'].reshape(-1)
+        self.add(scenario, variant, X, f)
+
+    def scenarios(self):
+        return sorted(self.X)
+
+    def get(self, scenario, variant=''):
+        # (X, f) of one scenario, or None
+        key = (scenario, variant)
+        if key not in self.X:
+            return None
+        return self.X[key], self.f[key]
+
+
+def select_seeds(X, f, k, initSpace, constraints=None, min_distance=1e-3):
+    # Best k feasible points, skipping points closer than min_distance (in
+    # the unit box of initSpace) to an already chosen one
+    X = np.asarray(X, dtype=float)
+    values = scalar(f)
+    ok = np.isfinite(values) & sampling.is_feasible(X, initSpace, constraints)
+    X, values = X[ok], values[ok]
+    widths = initSpace[:,1] - initSpace[:,0]
+    chosen = []
+    for j in np.argsort(values, kind='stable'):
+        if len(chosen) == k:
+            break
+        if chosen and np.min(np.linalg.norm((X[chosen] - X[j])/widths, axis=1)) < min_distance:
+            continue
+        chosen.append(j)
+    return X[chosen], values[chosen]
+
+
+def warm_start(prior, currentSamples, initSpace, compute_objective=None, surrogate=None, constraints=None,
+               seed=True):
+    '''
+    prior: (X, f) of earlier evaluations of the same scenario. Returns the
+    initial samples with as many chains as possible replaced by the best
+    prior points (unless seed is False, e.g. on resume), and their prior
+    objective values (NaN for chains that were not seeded), so that runFunc
+    does not simulate them again. The surrogate gets the prior points (at
+    most surrogate.max_points) and an ObjectiveCache (anything with
+    store_many) is pre-populated in memory.
+    '''
+    X, f = prior
+    X = np.asarray(X, dtype=float)
+    known = np.full(np.shape(currentSamples)[0], np.nan)
+    if X.shape[0] == 0:
+        return currentSamples, known
+
+    if surrogate is not None:
+        values = scalar(f)
+        keep = np.nonzero(np.isfinite(values))[0]
+        if keep.size > surrogate.max_points:
+            # the GP fit is cubic in its points: the best half of max_points
+            # plus a random subset of the rest
+            keep = keep[np.argsort(values[keep], kind='stable')]
+            half = surrogate.max_points//2
+            rest = np.random.choice(keep[half:], surrogate.max_points - half, replace=False)
+            keep = np.concatenate((keep[:half], rest))
+        surrogate.add_prior(X[keep], values[keep])
+    if hasattr(compute_objective, 'store_many'):
+        compute_objective.store_many(X, f, disk=False)
+    if not seed:
+        return currentSamples, known
+
+    seeds, values = select_seeds(X, f, currentSamples.shape[0], initSpace, constraints)
+    currentSamples = np.array(currentSamples, dtype=float)
+    currentSamples[:seeds.shape[0]] = seeds
+    known[:seeds.shape[0]] = values
+    print('WARM START: %i prior evaluations, %i chains seeded (best %.3f)'
+          % (X.shape[0], seeds.shape[0], values[0] if values.size else np.nan))
+    return currentSamples, known
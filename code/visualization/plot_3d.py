@@ -8,6 +8,9 @@ from mpl_toolkits.mplot3d import Axes3D
 import numpy as np
 from matplotlib import cm
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tools import run_log
+
 ################################################
 # PARAMETERS (set it up YO-self)
 ################################################
@@ -44,8 +47,19 @@ def getData2D(filepath):
 	return X1, X2
 
 
-X1, X2 = getData2D(os.path.join(FOLDER_PATH, 'x_history.csv'))
-R = getData1D(os.path.join(FOLDER_PATH, 'f_history.csv'))
+def getRunData(folder):
+	# x and f of every simulated sample: from the memory-mapped run log when
+	# the run wrote one, else from the exported CSV files
+	if os.path.exists(os.path.join(folder, run_log.LOG_NAME)):
+		log = run_log.read_log(folder)
+		x = log['x'].reshape(-1, log['x'].shape[-1])
+		return x[:, 0], x[:, 1], log['f'].reshape(-1)
+	X1, X2 = getData2D(os.path.join(folder, 'x_history.csv'))
+	R = getData1D(os.path.join(folder, 'f_history.csv'))
+	return X1, X2, R
+
+
+X1, X2, R = getRunData(FOLDER_PATH)
 ################
 # filter part
 ################
@@ -1,22 +1,22 @@
 import matplotlib.pyplot as plt
-import csv
 import os
 import sys
 from mpl_toolkits import mplot3d
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tools import trajectory
+
 def getData3D(filepath):
-	file = open(filepath)
-	reader = csv.reader(file)
-	data_str = list(reader)
-	file.close()
-	X1 = [float(x[0]) for x in data_str[:-1]]
-	X2 = [float(x[1]) for x in data_str[:-1]]
-	X3 = [float(x[2]) for x in data_str[:-1]]
-	return X1, X2, X3
+	# binary trajectory (memory-mapped columns) or old CSV with d, v_ego, v_pov
+	data = trajectory.load_columns(filepath)
+	return data['distance'], data['ego_velocity'], data['pov_velocity']
 
 #FOLDER_PATH = '/home/user/alena/rgt/res/res-default'
 FOLDER_PATH = '/home/user/alena/rgt/res/res-collision'
-D, V_ego, V_pov = getData3D(os.path.join(FOLDER_PATH, 'trajectory0.csv'))
+TRAJ_PATH = os.path.join(FOLDER_PATH, 'trajectory0' + trajectory.EXTENSION)
+if not os.path.exists(TRAJ_PATH):
+	TRAJ_PATH = os.path.join(FOLDER_PATH, 'trajectory0.csv')
+D, V_ego, V_pov = getData3D(TRAJ_PATH)
 I = range(len(D))
 
 plt.plot(I, D, 'r-', linewidth=6) 